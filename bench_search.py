@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the search algorithms in search.py and wordchain.py.
+
+Each algorithm is run over a fixed, seeded set of start/goal queries on every
+dataset (`prettygraph`, `graph` and the `*.graph` word files).  Every single
+run happens in a forked child process, so the memory figures of one run don't
+leak into the next.  For each run we record:
+
+    wall_time
+        Seconds spent in the search proper (graph loading and problem setup
+        are reported separately as `setup_time`).
+    expansions
+        Number of nodes whose children were generated.
+    peak_frontier
+        Largest size the frontier reached.
+    peak_rss_kb, rss_growth_kb
+        Peak resident set size of the child process, and how much of it was
+        added during the run.
+    events
+        Number of commands logged to the search history.
+    duplicate_pushes, visited_hits, log_time, expand_time, ...
+        The rest of the counters in instrument.search_stats.
+    length, solved
+        Length of the solution found, if any.
+
+Results are written as JSON, so they can be kept around and compared across
+commits:
+
+    python bench_search.py run --out before.json
+    (hack, hack)
+    python bench_search.py run --out after.json
+    python bench_search.py compare before.json after.json
+"""
+
+from __future__ import division
+
+import argparse
+from contextlib import contextmanager
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import instrument
+import prettygraph
+import search
+
+
+search_algorithms = ['breadth_first',
+                     'depth_first',
+                     'uniform_cost',
+                     'best_first',
+                     'astar',
+                     'bidirectional_astar',
+                     'vectorized_uniform_cost',
+                     'vectorized_astar']
+all_algorithms = search_algorithms + ['wordchain']
+
+
+def is_word_graph(name):
+    return name != 'prettygraph'
+
+def datasets():
+    return ['prettygraph', 'graph'] + sorted(glob.glob('*.graph'))
+
+def connected_ids(edges):
+    return sorted(set(id_ for edge in edges for id_ in edge))
+
+def queries(name, edges, count, seed):
+    """
+    Return `count` (start, goal) pairs for dataset `name`.
+
+    The same seed always gives the same queries for a given dataset.  Word
+    graphs named after a word chain (e.g. `rags-riches.graph`) get that
+    chain as their first query.
+    """
+    rng = random.Random("%s %s" % (seed, name))
+    ids = connected_ids(edges)
+    ret = []
+    if name.endswith('.graph'):
+        pair = name[:-len('.graph')].split('-')
+        if len(pair) == 2 and all(p in ids for p in pair):
+            ret.append(tuple(pair))
+    while len(ret) < count:
+        ret.append((rng.choice(ids), rng.choice(ids)))
+    return ret[:count]
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+@contextmanager
+def quiet():
+    "Silence the progress messages that the searches print."
+    stdout = sys.stdout
+    sys.stdout = file(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout = stdout
+
+def run_one(algorithm, vertices, edges, start, goal):
+    "Run a single query in this process and return its metrics."
+    import wordchain
+    rss_before = peak_rss_kb()
+    def log(*args):
+        pass
+    stats = instrument.search_stats()
+    setup_begin = time.time()
+    if algorithm == 'wordchain':
+        dictionary = set(v.id for v in vertices)
+        index = wordchain.neighbor_index(dictionary)
+        index.components
+        setup_end = time.time()
+        with quiet():
+            path = wordchain.wordchain(start, goal, dictionary, log_fn=log,
+                                      stats=stats, index=index)
+    else:
+        problem = search.problem_2d(vertices, edges, start, goal)
+        fn = getattr(search, algorithm + '_search')
+        if algorithm.startswith('vectorized_'):
+            # Don't time the NumPy import.
+            import vectorsearch
+        setup_end = time.time()
+        with quiet():
+            path = fn(problem, log, stats)
+    end = time.time()
+    peak = peak_rss_kb()
+    return dict(stats.summary(),
+                setup_time=setup_end - setup_begin,
+                wall_time=end - setup_end,
+                events=stats.log_calls,
+                peak_rss_kb=peak,
+                rss_growth_kb=peak - rss_before,
+                solved=path is not None,
+                length=len(path) if path else None)
+
+def child(conn, fn, *args):
+    try:
+        conn.send(fn(*args))
+    except Exception, e:
+        conn.send(dict(error=repr(e)))
+    conn.close()
+
+def run_isolated(timeout, fn, *args):
+    """
+    Call `fn(*args)` in a forked child process and return its result, giving
+    up after `timeout` seconds.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe(False)
+    p = multiprocessing.Process(target=child, args=(child_conn, fn) + args)
+    p.start()
+    child_conn.close()
+    if parent_conn.poll(timeout):
+        try:
+            ret = parent_conn.recv()
+        except EOFError:
+            # Killed before reporting; most likely out of memory.
+            ret = dict(error='child died')
+    else:
+        p.terminate()
+        ret = dict(error='timeout')
+    p.join()
+    return ret
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'],
+                stderr=file(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(options):
+    results = []
+    for name in options.datasets or datasets():
+        vertices, edges = prettygraph.load_graph(name)
+        for algorithm in options.algorithms:
+            if algorithm == 'wordchain' and not is_word_graph(name):
+                continue
+            for start, goal in queries(name, edges, options.queries,
+                                       options.seed):
+                r = run_isolated(options.timeout, run_one,
+                                 algorithm, vertices, edges, start, goal)
+                r.update(algorithm=algorithm,
+                         dataset=name,
+                         start=start,
+                         goal=goal)
+                print >> sys.stderr, "%-20s %-24s %s -> %s: %s" % (
+                        algorithm, name, start, goal,
+                        r.get('error') or "%.4fs" % r['wall_time'])
+                results.append(r)
+    return dict(revision=git_revision(),
+                python=platform.python_version(),
+                platform=platform.platform(),
+                timestamp=time.time(),
+                seed=options.seed,
+                queries=options.queries,
+                results=results)
+
+def totals(report):
+    "Sum wall time and expansions per (algorithm, dataset)."
+    ret = {}
+    for r in report['results']:
+        if 'error' in r:
+            continue
+        key = r['algorithm'], r['dataset']
+        wall_time, expansions = ret.get(key, (0, 0))
+        ret[key] = wall_time + r['wall_time'], expansions + r['expansions']
+    return ret
+
+def compare(before, after):
+    old = totals(before)
+    new = totals(after)
+    print "%-20s %-24s %10s %10s %7s %12s" % (
+            'algorithm', 'dataset', 'before', 'after', 'ratio', 'expansions')
+    for key in sorted(set(old) & set(new)):
+        (t0, e0), (t1, e1) = old[key], new[key]
+        print "%-20s %-24s %10.4f %10.4f %7.2f %5d->%-6d" % (
+                key + (t0, t1, t1 / t0 if t0 else float('inf'), e0, e1))
+
+def main():
+    parser = argparse.ArgumentParser(
+            description="Benchmark the search algorithms.")
+    commands = parser.add_subparsers(dest='command')
+    r = commands.add_parser('run', help="run the benchmarks")
+    r.add_argument('--seed', type=int, default=0)
+    r.add_argument('--queries', type=int, default=5,
+                   help="queries per algorithm and dataset")
+    r.add_argument('--timeout', type=float, default=60,
+                   help="seconds before a single run is given up")
+    r.add_argument('--algorithms', type=(lambda s: s.split(',')),
+                   default=all_algorithms)
+    r.add_argument('--datasets', nargs='*')
+    r.add_argument('--out', default='-')
+    c = commands.add_parser('compare', help="compare two result files")
+    c.add_argument('before')
+    c.add_argument('after')
+    options = parser.parse_args()
+    if options.command == 'run':
+        report = run(options)
+        out = sys.stdout if options.out == '-' else file(options.out, 'w')
+        json.dump(report, out, indent=1, sort_keys=True)
+        out.write('\n')
+    else:
+        compare(json.load(file(options.before)),
+                json.load(file(options.after)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the searchview loading and playback pipeline, headlessly.
+
+No window or GL context is needed: we exercise searchdata.py, which is what
+searchview.view runs on, and copy colors into plain ctypes arrays where the
+view would copy them into its GL vertex lists.
+
+For each graph/history pair we measure:
+
+    parse
+        Time to load the graph and history, in history lines and steps per
+        second.
+    seek
+        Random jumps to a point in time, as done by `view.go_to_time` when
+        the time slider is dragged.
+    play
+        A `control.play` sweep over the whole history at 60 frames per
+        second, reporting the mean and worst frame times.
+    bsp
+        Time to build the `bsp_tree` the view uses for mouse picking, and
+        random queries against it.
+
+and the memory high-water mark of the process that did all of the above.
+
+The `shipped` command benchmarks every graph/history pair referenced by the
+*.yaml layouts in this directory.  The `synthetic` command generates a graph
+and a history of the requested size first (see stressgraph.py), to see how
+far things scale:
+
+    python bench_view.py shipped
+    python bench_view.py synthetic --vertices 10000 --steps 1000000
+"""
+
+from __future__ import division
+
+import argparse
+from ctypes import c_ubyte
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import yaml
+
+from bench_search import git_revision, peak_rss_kb, run_isolated
+from searchdata import (bsp_tree, copy_buffer, graph_lines, parse,
+                        position_at_time)
+from stressgraph import write_synthetic
+
+
+fps = 60
+
+def shipped_pairs():
+    "Return the sorted (graph, history) pairs used by the *.yaml layouts."
+    ret = set()
+    def rec_find(d):
+        if isinstance(d, dict):
+            if 'graph' in d and 'history' in d:
+                ret.add((d['graph'], d['history']))
+            for child in d.get('children') or []:
+                rec_find(child)
+    for filename in glob.glob('*.yaml'):
+        rec_find(yaml.safe_load(file(filename)))
+    return sorted((g, h) for g, h in ret
+                  if os.path.exists(g) and os.path.exists(h))
+
+def timed(fn, *args):
+    begin = time.time()
+    ret = fn(*args)
+    return time.time() - begin, ret
+
+def count_lines(filename):
+    return sum(1 for line in file(filename))
+
+def bench_pair(graph, history, seeks, queries, play_time, seed):
+    "Benchmark one graph/history pair in this process."
+    rng = random.Random(seed)
+    rss_before = peak_rss_kb()
+    parse_time, (vertices, edges, start, goal, color_history) = timed(
+            parse, graph_lines(graph), file(history))
+    ret = dict(graph=graph,
+               history=history,
+               vertices=len(vertices.flat_list),
+               edges=len(edges) // 4,
+               steps=len(color_history) - 1,
+               parse_time=parse_time,
+               lines_per_second=(sum(1 for l in graph_lines(graph))
+                                 + count_lines(history))
+                                / parse_time,
+               steps_per_second=(len(color_history) - 1) / parse_time)
+
+    # Stand-ins for the GL color buffers of the view.
+    vertex_colors = (c_ubyte * len(color_history[0].vertex_colors))()
+    edge_colors = (c_ubyte * len(color_history[0].edge_colors))()
+    def go_to_time(t):
+        current = color_history[position_at_time(color_history, t)]
+        copy_buffer(vertex_colors, current.vertex_colors)
+        copy_buffer(edge_colors, current.edge_colors)
+
+    end_time = color_history[-1].time
+    times = [rng.uniform(0, end_time) for i in xrange(seeks)]
+    seek_time, _ = timed(lambda: map(go_to_time, times))
+    ret.update(seeks_per_second=seeks / seek_time)
+
+    frame_times = []
+    frames = int(play_time * fps)
+    for frame in xrange(frames + 1):
+        begin = time.time()
+        go_to_time(end_time * frame / frames)
+        frame_times.append(time.time() - begin)
+    ret.update(play_frames=len(frame_times),
+               play_mean_frame_time=sum(frame_times) / len(frame_times),
+               play_worst_frame_time=max(frame_times),
+               play_dropped_frames=sum(1 for t in frame_times if t > 1 / fps))
+
+    build_time, tree = timed(bsp_tree, vertices.flat_list)
+    (min_x, min_y), (max_x, max_y) = bsp_tree.extents(vertices.flat_list)
+    points = [(rng.uniform(min_x, max_x), rng.uniform(min_y, max_y))
+              for i in xrange(queries)]
+    query_time, _ = timed(lambda: [tree.query(x, y) for x, y in points])
+    ret.update(bsp_build_time=build_time,
+               bsp_queries_per_second=queries / query_time)
+
+    peak = peak_rss_kb()
+    ret.update(peak_rss_kb=peak, rss_growth_kb=peak - rss_before)
+    return ret
+
+def limit_memory(megabytes):
+    "Make allocations beyond `megabytes` raise MemoryError in this process."
+    if megabytes:
+        limit = megabytes * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def bench_limited(memory_limit, *args):
+    limit_memory(memory_limit)
+    return bench_pair(*args)
+
+def report(results, options):
+    return dict(revision=git_revision(),
+                python=platform.python_version(),
+                platform=platform.platform(),
+                timestamp=time.time(),
+                seed=options.seed,
+                results=results)
+
+def run_pairs(pairs, options):
+    results = []
+    for graph, history in pairs:
+        r = run_isolated(options.timeout, bench_limited, options.memory_limit,
+                         graph, history, options.seeks, options.queries,
+                         options.play_time, options.seed)
+        r.update(graph=graph, history=history)
+        print >> sys.stderr, "%-24s %-24s %s" % (
+                graph, history,
+                r.get('error') or "parsed in %.3fs" % r['parse_time'])
+        results.append(r)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+            description="Benchmark searchview loading and playback.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--seeks', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=100000,
+                        help="number of bsp_tree queries")
+    parser.add_argument('--play-time', type=float, default=4,
+                        help="seconds the simulated playback lasts")
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--memory-limit', type=int, default=0,
+                        help="address space limit in MB (0 for none)")
+    parser.add_argument('--out', default='-')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('shipped', help="benchmark the shipped histories")
+    s = commands.add_parser('synthetic',
+                            help="benchmark a generated graph and history")
+    s.add_argument('--vertices', type=int, default=10000)
+    s.add_argument('--steps', type=int, default=1000000)
+    s.add_argument('--events-per-step', type=int, default=2)
+    s.add_argument('--keep', action='store_true',
+                   help="don't delete the generated files")
+    options = parser.parse_args()
+    if options.command == 'shipped':
+        results = run_pairs(shipped_pairs(), options)
+    else:
+        graph = tempfile.NamedTemporaryFile(prefix='synthetic', suffix='.graph',
+                                            delete=not options.keep)
+        history = tempfile.NamedTemporaryFile(prefix='synthetic',
+                                              suffix='_history',
+                                              delete=not options.keep)
+        generation_time, _ = timed(write_synthetic, graph, history,
+                                   options.vertices, options.steps,
+                                   options.events_per_step, options.seed)
+        graph.flush()
+        history.flush()
+        results = run_pairs([(graph.name, history.name)], options)
+        results[0].update(generation_time=generation_time,
+                          events_per_step=options.events_per_step)
+    out = sys.stdout if options.out == '-' else file(options.out, 'w')
+    json.dump(report(results, options), out, indent=1, sort_keys=True)
+    out.write('\n')
+
+if __name__ == '__main__':
+    main()
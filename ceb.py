@@ -21,7 +21,6 @@ which is closest to the mouse cursor.
 
 from __future__ import division
 
-from heapq import heappush, heappop
 import pickle
 import sys
 
@@ -34,23 +33,23 @@ from pyglet.gl import *
 from la import vec2
 from util import obj
 
-
-# Small tolerance for errors caused by floating point inaccuracy.
-epsilon = 0.0000001
+import cebsearch
+from gridhash import grid_hash
 
 
 w = pyglet.window.Window()
 
 
-def squaredist(v1, v2):
-    dx = v1.x - v2.x
-    dy = v1.y - v2.y
-    return dx * dx + dy * dy
-
 class edge:
     def __init__(self, endpoint1, endpoint2):
         self.endpoints = endpoint1, endpoint2
 
+def vertex_position(v):
+    return v.x, v.y
+
+def midpoint_position((a, b)):
+    return (a.x + b.x) / 2, (a.y + b.y) / 2
+
 
 start_poly = [vec2(x, y) for x, y in (-5, -8), (8, 0), (-5, 8)]
 goal_poly = [vec2(x, y) for x, y in (-4, -8), (4, -8), (4, 8), (-4, 8)]
@@ -59,14 +58,16 @@ goal_poly = [vec2(x, y) for x, y in (-4, -8), (4, -8), (4, 8), (-4, 8)]
 # App state.
 
 def app_state(start, goal, vertices=None, edges=None):
-    if vertices is None:
-        vertices = [start, goal]
-    if edges is None:
-        edges = []
+    net = cebsearch.network(start, goal, vertices, edges)
     return obj(start=start,
                goal=goal,
-               vertices=vertices,
-               edges=edges,
+               vertices=net.vertices,
+               edges=net.edges,
+               network=net,
+               vertex_index=grid_hash(vertex_position, net.vertices),
+               midpoint_index=grid_hash(midpoint_position, net.edges),
+               search=cebsearch.background_search(net),
+               edits=[],
                mouse_pos=None,
                closest=None,
                origin=None,
@@ -74,8 +75,7 @@ def app_state(start, goal, vertices=None, edges=None):
                optimal_path=None,
                bidi_path=None,
                bidi_meeting_point=None,
-               right_bidi_path=None,
-               search_obsolete=True)
+               right_bidi_path=None)
 
 @w.event
 def on_mouse_motion(x, y, *etc):
@@ -102,9 +102,7 @@ def on_key_press(k, *etc):
 @w.event
 def on_draw():
 
-    if aps.search_obsolete:
-        update_search()
-        aps.search_obsolete = False
+    update_search()
 
     glClear(GL_COLOR_BUFFER_BIT)
     glColor3f(*colors['white'])
@@ -156,7 +154,7 @@ def run():
             aps.closest = closest_vertex(evt.pos)
         elif evt.type == 'press':
             if evt.button == mouse.RIGHT:
-                aps.vertices.append(evt.pos)
+                add_vertex(evt.pos)
             elif evt.button == mouse.LEFT:
                 aps.closest = closest_vertex(evt.pos)
                 init_pos = aps.closest.copy()
@@ -164,8 +162,8 @@ def run():
                     newevt = ch.receive()
                     if newevt.type == 'motion':
                         aps.closest.become(init_pos + newevt.pos - evt.pos)
+                        vertex_moved(aps.closest)
                     elif newevt.type == 'release':
-                        aps.search_obsolete = True
                         break
             elif evt.button == mouse.MIDDLE:
                 aps.origin = closest_vertex(evt.pos)
@@ -176,40 +174,28 @@ def run():
                         break
                     elif (newevt.type == 'release' 
                           and newevt.button == mouse.MIDDLE):
-                        vcopy = aps.vertices[:]
-                        vcopy.remove(aps.origin)
-                        dest = closest_vertex(newevt.pos, vcopy)
-                        add_edge(aps.origin, dest)
+                        dest = closest_vertex(newevt.pos, aps.origin)
+                        if dest is not None:
+                            add_edge(aps.origin, dest)
                         break
                     elif newevt.type == 'motion':
-                        vcopy = aps.vertices[:]
-                        vcopy.remove(aps.origin)
-                        aps.target = closest_vertex(newevt.pos, vcopy)
+                        aps.target = closest_vertex(newevt.pos, aps.origin)
                 aps.origin = aps.target = None
         elif evt.type == 'key':
             if evt.key == key.DELETE:
                 if aps.closest not in [aps.start, aps.goal, None]:
-                    aps.vertices.remove(aps.closest)
-                    for a, b in aps.edges[:]:
-                        if a is aps.closest or b is aps.closest:
-                            remove_edge(a, b)
+                    delete_vertex(aps.closest)
                     aps.closest = None
             elif evt.key == key.BACKSPACE:
                 if aps.mouse_pos is not None:
-                    d = dict([((a+b)/2, (a, b)) for a, b in aps.edges])
-                    closest_midpoint = closest_vertex(aps.mouse_pos, d.keys())
-                    remove_edge(*d[closest_midpoint])
+                    closest_edge = aps.midpoint_index.closest(aps.mouse_pos)
+                    if closest_edge is not None:
+                        remove_edge(*closest_edge)
             elif evt.key == key.RETURN:
                 save_network("save.net")
 
 def save_network(filename):
-    sv = dict((id(v), (v.x, v.y)) for v in aps.vertices)
-    se = [(id(a), id(b)) for a, b in aps.edges]
-    pickle.dump(dict(start=id(aps.start),
-                     goal=id(aps.goal),
-                     vertices=sv,
-                     edges=se),
-                file(filename, 'w'))
+    cebsearch.save_network(aps.network, filename)
 
 def load_network(filename):
     d = pickle.load(file(filename))
@@ -222,42 +208,78 @@ def load_network(filename):
                      vertices.values(),
                      edges)
 
+def add_vertex(v):
+    aps.network.add_vertex(v)
+    aps.vertex_index.add(v)
+    aps.edits.append(('add_vertex', id(v), v.x, v.y))
+
+def vertex_moved(v):
+    aps.vertex_index.move(v)
+    for e in incident_edges(v):
+        aps.midpoint_index.move(e)
+    aps.edits.append(('move', id(v), v.x, v.y))
+
+def delete_vertex(v):
+    for e in incident_edges(v):
+        # There may be several copies of an edge.
+        while e in aps.midpoint_index.cell_of:
+            remove_edge(*e)
+    aps.network.delete_vertex(v)
+    aps.vertex_index.remove(v)
+    aps.edits.append(('delete_vertex', id(v)))
+
+def incident_edges(v):
+    "The edges `v` is in, as they are in aps.edges."
+    ret = []
+    for n in aps.network.neighbors(v):
+        for e in (v, n), (n, v):
+            if e in aps.midpoint_index.cell_of and e not in ret:
+                ret.append(e)
+    return ret
+
 def add_edge(a, b):
-    aps.search_obsolete = True
-    aps.edges.append((a, b))
+    aps.network.add_edge(a, b)
+    aps.midpoint_index.add((a, b))
+    aps.edits.append(('add_edge', id(a), id(b)))
 
 def remove_edge(a, b):
-    aps.search_obsolete = True
-    aps.edges.remove((a, b))
+    aps.network.remove_edge(a, b)
+    aps.midpoint_index.remove((a, b))
+    aps.edits.append(('remove_edge', id(a), id(b)))
 
 def update_search():
-    aps.optimal_path = astar()
-    aps.right_bidi_path = right_bidirectional_astar()
-    #assert abs(path_cost(right_bidi_path)
-    #           - path_cost(aps.optimal_path)) < epsilon
-    aps.bidi_path, aps.bidi_meeting_point = wrong_bidirectional_astar()
-    if aps.optimal_path and aps.bidi_path:
-        bipc = path_cost(aps.bidi_path)
-        oppc = path_cost(aps.optimal_path)
-        if bipc > oppc:
-            print "FOUND A COUNTEREXAMPLE!"
-            print "Bidirectional search is settling for a path of length",
-            print bipc, "when one of", oppc, "is available."
-            save_network("counterexample.net")
-        if bipc < oppc:
-            print "FOUND AN ANOMALY!"
-            print "Bidirectional search seems to be beating plain A*",
-            print bipc, "to", oppc, ".  Fix this!"
-            save_network("anomaly.net")
-
-def path_cost(path):
-    return sum((a-b).length()
-               for a, b in zip(path[:-1], path[1:]))
-
-def closest_vertex(p, vertices=None):
-    if vertices is None:
-        vertices = aps.vertices
-    return min(vertices, key=(lambda v: squaredist(v, p)))
+    """
+    Send the edits made since the last frame to the background search, and
+    show the latest paths it has found, if any.
+
+    The search process also reports counterexamples (see
+    cebsearch.check_paths), and the errors of the searches are printed.
+    """
+    if aps.edits:
+        aps.search.edits(aps.edits)
+        aps.edits = []
+    result = aps.search.result()
+    if result is None:
+        return
+    received, optimal, right_bidi, bidi, meeting_point, errors = result
+    for error in errors:
+        print "Search failed:"
+        print error
+    by_id = dict((id(v), v) for v in aps.vertices)
+    def vertices(ids):
+        return ids and [by_id[i] for i in ids]
+    try:
+        paths = map(vertices, [optimal, right_bidi, bidi])
+        meeting_point = meeting_point and by_id[meeting_point]
+    except KeyError:
+        # Some of these vertices have been deleted since; the results for
+        # that are on their way.
+        return
+    (aps.optimal_path, aps.right_bidi_path, aps.bidi_path) = paths
+    aps.bidi_meeting_point = meeting_point
+
+def closest_vertex(p, exclude=None):
+    return aps.vertex_index.closest(p, exclude)
 
 ch = stackless.channel()
 
@@ -270,117 +292,6 @@ colors = {'white': (1., 1., 1.),
           'cyan': (.0, .7, .7),
           'purple': (1., .0, 1.)}
 
-def astar():
-    visited = set()
-    frontier = [(0, 0, [aps.start])]
-    while frontier:
-        heuristic, cost, path = heappop(frontier)
-        last = path[-1]
-        if last is aps.goal:
-            return path
-        if last in visited:
-            continue
-        visited.add(last)
-        for a, b in aps.edges:
-            if b is last:
-                a, b = b, a
-            if a is last and b not in visited:
-                new_cost = cost + (a-b).length()
-                estimate_to_goal = (aps.goal-b).length()
-                heappush(frontier, 
-                         (new_cost+estimate_to_goal, 
-                          new_cost, 
-                          path + [b]))
-
-class search_state:
-    def __init__(self, start, goal, with_contact):
-        self.visited = set()
-        # Estimated cost, cost so far, chain, contact.
-        #
-        # I pick a list for contact to make it mutable and easy to check 
-        # for (non)emptiness.
-        if with_contact:
-            self.frontier = [(0, 0, [start], [])]
-        else:
-            self.frontier = [(0, 0, [start])]
-        self.goal = goal
-        
-def wrong_bidirectional_astar():
-    """
-    This version returns a (path, contact_point) pair.
-    """
-    searches = [search_state(aps.start, aps.goal, True),
-                search_state(aps.goal, aps.start, True)]
-    while all(s.frontier for s in searches):
-        for search, other in searches, reversed(searches):
-            heuristic, cost, path, contact = heappop(search.frontier)
-            last = path[-1]
-            if last in search.visited:
-                continue
-            search.visited.add(last)
-            if contact:
-                sol_path = path[:-1] + list(reversed(contact[0]))
-                if search.goal is aps.start:
-                    sol_path.reverse()
-                return sol_path, last
-            for h, c, other_path, other_contact in other.frontier:
-                if other_path[-1] == last:
-                    other_contact.append(path)
-            for a, b in aps.edges:
-                if b is last:
-                    a, b = b, a
-                if a is last and b not in search.visited:
-                    new_cost = cost + (a-b).length()
-                    estimate_to_goal = (search.goal-b).length()
-                    heappush(search.frontier, 
-                             (new_cost+estimate_to_goal, 
-                              new_cost, 
-                              path + [b],
-                              []))
-    return None, None
-
-def right_bidirectional_astar():
-    """
-    This version returns a (path, contact_point) pair.
-    """
-    searches = [search_state(aps.start, aps.goal, False),
-                search_state(aps.goal, aps.start, False)]
-    shortest_found = sys.maxint
-    best_path = None
-    while all(s.frontier for s in searches):
-        for search, other in searches, reversed(searches):
-            heuristic, cost, path = heappop(search.frontier)
-            last = path[-1]
-            if last in search.visited or heuristic > shortest_found:
-                continue
-            search.visited.add(last)
-            for h, c, other_path in other.frontier:
-                if other_path[-1] == last:
-                    length = path_cost(path) + path_cost(other_path)
-                    if length < shortest_found:
-                        shortest_found = length
-                        best_path = path, other_path
-            for a, b in aps.edges:
-                if b is last:
-                    a, b = b, a
-                if a is last and b not in search.visited:
-                    new_cost = cost + (a-b).length()
-                    estimate_to_goal = (search.goal-b).length()
-                    heuristic = new_cost + estimate_to_goal
-                    if heuristic < shortest_found:
-                        heappush(search.frontier, 
-                                 (heuristic, 
-                                  new_cost, 
-                                  path + [b]))
-    if best_path is None:
-        return None
-    else:
-        a, b = best_path
-        ret = a[:-1] + list(reversed(b))
-        if ret[0] is not aps.start:
-            ret.reverse()
-        return ret
-
                          
 glClearColor(.5, .5, .5, 1.)
 glPointSize(4)
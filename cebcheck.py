@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+Check cebsearch's lpastar and right_bidirectional_astar, and gridhash's
+grid_hash, against the obvious ways of doing the same, on random input.
+
+    python cebcheck.py [--rounds=<n>] [--seed=<n>]
+
+Each round makes a random network on a small grid of coordinates, so
+vertices often share a position, and edits it at random, as ceb.py would.
+After every edit, the paths lpastar and right_bidirectional_astar find are
+checked against astar's, and the vertex a grid_hash of them (with each
+vertex in it twice) finds closest to a random point, against a linear scan.
+
+The first failure is printed, and saved (see cebsearch.save_network) to
+check-<seed>.net, where ceb.py can load it.  The same seed always gives the
+same networks.
+"""
+
+from __future__ import division
+
+import random
+import sys
+
+from cebsearch import (astar, epsilon, lpastar, network, path_cost, point,
+                       right_bidirectional_astar, save_network)
+from gridhash import grid_hash
+
+
+# Coordinates are drawn from range(grid) or, half the time, from anywhere
+# in between.
+grid = 6
+edits_per_round = 20
+
+def random_point(rng, id_):
+    return point(id_, *[rng.choice([rng.randrange(grid),
+                                    rng.uniform(0, grid)])
+                        for i in xrange(2)])
+
+def position(v):
+    return v.x, v.y
+
+def random_edit(rng, net, lpa, index, next_id):
+    "Make a random edit to `net`, and tell `lpa` and `index` about it."
+    r = rng.random()
+    if r < .3 or not net.edges:
+        a, b = rng.sample(net.vertices, 2)
+        net.add_edge(a, b)
+        lpa.edge_changed(a, b)
+    elif r < .5:
+        a, b = rng.choice(net.edges)
+        net.remove_edge(a, b)
+        lpa.edge_changed(a, b)
+    elif r < .7:
+        v = rng.choice(net.vertices)
+        new = random_point(rng, v.id)
+        v.x, v.y = new.x, new.y
+        lpa.vertex_moved(v)
+        index.move(v)
+    elif r < .85:
+        vertices = [v for v in net.vertices
+                    if v is not net.start and v is not net.goal]
+        if vertices:
+            v = rng.choice(vertices)
+            lpa.vertex_deleted(v, net.delete_vertex(v))
+            while v in index.cell_of:
+                index.remove(v)
+    else:
+        v = random_point(rng, next_id)
+        net.add_vertex(v)
+        index.add(v)
+
+def is_path(net, path):
+    return (path[0] is net.start
+            and path[-1] is net.goal
+            and all(b in net.neighbors(a) for a, b in zip(path, path[1:])))
+
+def check_paths(net, lpa):
+    "Return what's wrong with the paths found in `net`, or None."
+    optimal = astar(net)
+    for name, path in [('lpastar', lpa.path()),
+                       ('right_bidirectional_astar',
+                        right_bidirectional_astar(net))]:
+        if optimal is None:
+            if path is not None:
+                return "%s found a path where there is none" % name
+        elif path is None:
+            return "%s found no path" % name
+        elif not is_path(net, path):
+            return "%s found something that is not a path" % name
+        # lpastar takes edges with no length to cost epsilon.
+        elif (abs(path_cost(path) - path_cost(optimal))
+              > epsilon * len(path)):
+            return ("%s found a path of length %r, where astar found one of %r"
+                    % (name, path_cost(path), path_cost(optimal)))
+    return None
+
+def check_index(net, index, rng):
+    "Return what's wrong with `index`, or None."
+    p = point(None, rng.uniform(-1, grid + 1), rng.uniform(-1, grid + 1))
+    exclude = rng.choice(net.vertices + [None])
+    closest = index.closest(p, exclude)
+    candidates = [v for v in net.vertices if v is not exclude]
+    if not candidates:
+        return closest and "grid_hash found a vertex where there is none"
+    def d2(v):
+        dx = v.x - p.x
+        dy = v.y - p.y
+        return dx * dx + dy * dy
+    if closest is None or d2(closest) != min(map(d2, candidates)):
+        return "grid_hash didn't find the closest vertex"
+    return None
+
+def check(seed):
+    """
+    Make and edit a network with this seed, and return it, and what went
+    wrong or None if nothing did.
+    """
+    rng = random.Random(seed)
+    n = rng.randint(2, 12)
+    vertices = [random_point(rng, i) for i in xrange(n)]
+    edges = [(a, b) for a in vertices for b in vertices
+             if a.id < b.id and rng.random() < .25]
+    net = network(vertices[0], vertices[1], vertices, edges)
+    lpa = lpastar(net)
+    # Every vertex twice, so moving and removing copies is checked too.
+    index = grid_hash(position, vertices + vertices, cell_size=1)
+    for edit in xrange(edits_per_round):
+        problem = check_paths(net, lpa) or check_index(net, index, rng)
+        if problem is not None:
+            return net, "%s, after %d edits" % (problem, edit)
+        random_edit(rng, net, lpa, index, n + edit)
+    return net, None
+
+def run(rounds, seed):
+    for s in xrange(seed, seed + rounds):
+        net, problem = check(s)
+        if problem is not None:
+            filename = "check-%d.net" % s
+            save_network(net, filename, key=(lambda v: v.id))
+            print "Seed %d: %s.  Saved to %s." % (s, problem, filename)
+            return False
+    print rounds, "networks checked,", rounds * edits_per_round, "edits."
+    return True
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], True)
+                   for arg in sys.argv[1:]
+                   if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if args or any(value is True for value in options.values()):
+        print "Usage: %s [--rounds=<n>] [--seed=<n>]" % sys.argv[0]
+        sys.exit(1)
+    if not run(int(options.get('rounds', 1000)),
+               int(options.get('seed', 0))):
+        sys.exit(1)
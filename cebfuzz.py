@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""
+Look for networks where ceb.py's bidirectional searches go wrong, without
+having to draw them.
+
+    python cebfuzz.py [--networks=<n>] [--vertices=<n>] [--workers=<n>]
+                      [--seed=<n>] [--out=<directory>]
+
+Each network is a prettygraph of about `vertices` vertices, between two of
+them picked at random, and is searched with cebsearch's three searches.
+The ones where a search fails (see `failure`) are shrunk by deleting
+vertices and edges for as long as it keeps failing the same way, and saved
+to `<out>/<kind>-<seed>.net`, which ceb.py can load.
+
+The networks are generated and searched by a pool of `workers` processes
+(by default, one per CPU), a batch at a time.  The same seed always gives
+the same networks.
+"""
+
+from __future__ import division
+
+import math
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import time
+
+import cebsearch
+from cebsearch import epsilon, network, path_cost, point
+import prettygraph
+
+
+# Networks per task handed to a worker.
+batch_size = 1000
+
+def random_network(seed, vertices):
+    "Return a network like prettygraph's, with about `vertices` vertices."
+    rng = random.Random(seed)
+    side = math.sqrt(vertices * prettygraph.area_per_vertex)
+    width = side * rng.uniform(.5, 1.5)
+    height = vertices * prettygraph.area_per_vertex / width
+    # Fewer tries than verts makes by default leave a few more holes, but
+    # take half as long, and networks this small are mostly border anyway.
+    verts = prettygraph.verts(width, height, rng.getrandbits(32), tries=8)
+    points = [point(v.id, v.x, v.y) for v in verts]
+    edges = [(points[a.id], points[b.id])
+             for a, b in prettygraph.edges(verts, rng)]
+    if len(points) < 2:
+        return None
+    start, goal = rng.sample(points, 2)
+    return network(start, goal, points, edges)
+
+def failure(net):
+    """
+    Return how the searches fail on `net`, or None if they don't:
+
+        'counterexample'
+            wrong_bidirectional_astar found a longer path than astar.
+        'anomaly'
+            wrong_bidirectional_astar found a shorter path than astar.
+        'missing'
+            wrong_bidirectional_astar found no path when there is one, or
+            the other way round.
+        'right'
+            right_bidirectional_astar doesn't agree with astar.
+    """
+    optimal = cebsearch.astar(net)
+    right = cebsearch.right_bidirectional_astar(net)
+    bidi, meeting_point = cebsearch.wrong_bidirectional_astar(net)
+    if optimal is None:
+        if bidi is not None:
+            return 'missing'
+        if right is not None:
+            return 'right'
+        return None
+    oppc = path_cost(optimal)
+    if right is None or abs(path_cost(right) - oppc) > epsilon:
+        return 'right'
+    if bidi is None:
+        return 'missing'
+    bipc = path_cost(bidi)
+    if bipc > oppc + epsilon:
+        return 'counterexample'
+    if bipc < oppc - epsilon:
+        return 'anomaly'
+    return None
+
+def minimize(net, kind):
+    """
+    Return a network with the same start and goal as `net`, and some of its
+    vertices and edges, where the searches fail the same way (`kind`), and
+    keep failing that way no matter which single vertex or edge is deleted.
+
+    Vertices, then edges, are deleted one by one, keeping each deletion
+    after which the searches still fail, until none can be.
+    """
+    while True:
+        size = len(net.vertices), len(net.edges)
+        for v in list(net.vertices):
+            if v is net.start or v is net.goal:
+                continue
+            candidate = network(net.start, net.goal,
+                                [u for u in net.vertices if u is not v],
+                                [(a, b) for a, b in net.edges
+                                 if a is not v and b is not v])
+            if failure(candidate) == kind:
+                net = candidate
+        for e in list(net.edges):
+            candidate = network(net.start, net.goal, list(net.vertices),
+                                [f for f in net.edges if f is not e])
+            if failure(candidate) == kind:
+                net = candidate
+        if (len(net.vertices), len(net.edges)) == size:
+            return net
+
+def fuzz((first_seed, count, vertices)):
+    """
+    Search the networks with seeds `first_seed` to `first_seed + count`.
+    Return the number of networks searched, and a list with the seed, the
+    kind of failure and the minimized network, in the format save_network
+    writes, of each failing one.
+    """
+    failures = []
+    for seed in xrange(first_seed, first_seed + count):
+        net = random_network(seed, vertices)
+        if net is None:
+            continue
+        kind = failure(net)
+        if kind is not None:
+            net = minimize(net, kind)
+            failures.append((seed, kind,
+                             cebsearch.network_data(net, key=(lambda v:
+                                                              v.id))))
+    return count, failures
+
+def run(networks, vertices, workers=None, seed=0, out='.'):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    tasks = [(first, min(batch_size, seed + networks - first), vertices)
+             for first in xrange(seed, seed + networks, batch_size)]
+    if workers:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(fuzz, tasks)
+    else:
+        pool = None
+        results = (fuzz(task) for task in tasks)
+    begin = time.time()
+    searched = 0
+    kinds = {}
+    try:
+        for count, failures in results:
+            searched += count
+            for network_seed, kind, data in failures:
+                kinds[kind] = kinds.get(kind, 0) + 1
+                filename = os.path.join(out, "%s-%s.net"
+                                             % (kind, network_seed))
+                pickle.dump(data, file(filename, 'w'))
+                print kind, "in network", network_seed, "saved to",
+                print filename, "with", len(data['vertices']), "vertices."
+    finally:
+        if pool is not None:
+            pool.terminate()
+    elapsed = time.time() - begin
+    print searched, "networks searched in %.1fs" % elapsed,
+    print "(%.0f per second)." % (searched / elapsed if elapsed else 0)
+    for kind, n in sorted(kinds.items()):
+        print n, kind
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], True)
+                   for arg in sys.argv[1:]
+                   if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if args or any(value is True for value in options.values()):
+        print ("Usage: %s [--networks=<n>] [--vertices=<n>] [--workers=<n>] "
+               "[--seed=<n>] [--out=<directory>]" % sys.argv[0])
+        sys.exit(1)
+    workers = options.get('workers')
+    run(int(options.get('networks', 100000)),
+        int(options.get('vertices', 10)),
+        workers and int(workers),
+        int(options.get('seed', 0)),
+        options.get('out', '.'))
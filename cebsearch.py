@@ -0,0 +1,563 @@
+"""
+The searches ceb.py compares, on networks kept apart from the editor so they
+can be run without a window.
+
+A `network` is a start vertex, a goal vertex, a list of vertices and a list
+of edges as (vertex, vertex) pairs, like the editor's, plus a map from every
+vertex to its neighbors that `add_edge`, `remove_edge`, `add_vertex` and
+`delete_vertex` keep up to date.  Vertices are anything with `x` and `y`
+attributes that can be put in a set (ceb.py uses la.vec2s), and they are
+told apart by identity.  Edges cost their length.
+
+`astar`, `wrong_bidirectional_astar` and `right_bidirectional_astar` search a
+network from scratch.  `lpastar` keeps the result of a search and repairs it
+after each edit, doing work in proportion to how much the edit changed.
+
+`background_search` runs the searches in another process, so the editor
+never waits for them.
+"""
+
+from __future__ import division
+
+from heapq import heappush, heappop
+import math
+import multiprocessing
+import pickle
+import sys
+import traceback
+
+
+# Small tolerance for errors caused by floating point inaccuracy.
+epsilon = 0.0000001
+
+
+inf = float('inf')
+
+def distance(a, b):
+    return math.hypot(a.x - b.x, a.y - b.y)
+
+def cost(a, b):
+    "What lpastar takes the edge between `a` and `b` to cost."
+    return distance(a, b) or epsilon
+
+def path_cost(path):
+    return sum(distance(a, b)
+               for a, b in zip(path[:-1], path[1:]))
+
+class point:
+    "A vertex of a network rebuilt from ids and coordinates."
+    def __init__(self, id_, x, y):
+        self.id = id_
+        self.x = x
+        self.y = y
+
+    def __lt__(self, other):
+        # The searches' heaps break ties between paths by comparing their
+        # vertices; by id, so they do the same every time a network is
+        # loaded, wherever its points are in memory.
+        return self.id < other.id
+
+class network:
+
+    def __init__(self, start, goal, vertices=None, edges=None):
+        if vertices is None:
+            vertices = [start, goal]
+        if edges is None:
+            edges = []
+        self.start = start
+        self.goal = goal
+        self.vertices = vertices
+        self.edges = edges
+        self.adjacency = dict((v, []) for v in vertices)
+        for a, b in edges:
+            self.adjacency[a].append(b)
+            self.adjacency[b].append(a)
+
+    def neighbors(self, v):
+        return self.adjacency[v]
+
+    def add_vertex(self, v):
+        self.vertices.append(v)
+        self.adjacency[v] = []
+
+    def delete_vertex(self, v):
+        "Delete `v` and every edge it's in.  Return its former neighbors."
+        neighbors = list(self.adjacency[v])
+        for a, b in [e for e in self.edges if e[0] is v or e[1] is v]:
+            self.remove_edge(a, b)
+        self.vertices.remove(v)
+        del self.adjacency[v]
+        return neighbors
+
+    def add_edge(self, a, b):
+        self.edges.append((a, b))
+        self.adjacency[a].append(b)
+        self.adjacency[b].append(a)
+
+    def remove_edge(self, a, b):
+        self.edges.remove((a, b))
+        remove_identical(self.adjacency[a], b)
+        remove_identical(self.adjacency[b], a)
+
+def remove_identical(l, x):
+    "Remove the first element of list `l` that is `x`."
+    for i, y in enumerate(l):
+        if y is x:
+            del l[i]
+            return
+    raise ValueError("not in list")
+
+def astar(net):
+    goal = net.goal
+    visited = set()
+    frontier = [(0, 0, [net.start])]
+    while frontier:
+        heuristic, cost, path = heappop(frontier)
+        last = path[-1]
+        if last is goal:
+            return path
+        if last in visited:
+            continue
+        visited.add(last)
+        for b in net.adjacency[last]:
+            if b not in visited:
+                new_cost = cost + distance(last, b)
+                estimate_to_goal = distance(goal, b)
+                heappush(frontier,
+                         (new_cost+estimate_to_goal,
+                          new_cost,
+                          path + [b]))
+
+class search_state:
+    def __init__(self, start, goal, with_contact):
+        self.visited = set()
+        # Estimated cost, cost so far, chain, contact.
+        #
+        # I pick a list for contact to make it mutable and easy to check
+        # for (non)emptiness.
+        if with_contact:
+            entry = (0, 0, [start], [])
+        else:
+            entry = (0, 0, [start])
+        self.frontier = [entry]
+        # The entries in the frontier, by the last vertex of their chain.
+        self.by_last = {start: [entry]}
+        self.goal = goal
+
+    def push(self, entry):
+        heappush(self.frontier, entry)
+        self.by_last.setdefault(entry[2][-1], []).append(entry)
+
+    def pop(self):
+        entry = heappop(self.frontier)
+        remove_identical(self.by_last[entry[2][-1]], entry)
+        return entry
+
+    def ending_at(self, v):
+        "The entries in the frontier whose chain ends at `v`."
+        return self.by_last.get(v, ())
+
+def wrong_bidirectional_astar(net):
+    """
+    This version returns a (path, contact_point) pair.
+    """
+    searches = [search_state(net.start, net.goal, True),
+                search_state(net.goal, net.start, True)]
+    while all(s.frontier for s in searches):
+        for search, other in searches, reversed(searches):
+            heuristic, cost, path, contact = search.pop()
+            last = path[-1]
+            if last in search.visited:
+                continue
+            search.visited.add(last)
+            if contact:
+                sol_path = path[:-1] + list(reversed(contact[0]))
+                if search.goal is net.start:
+                    sol_path.reverse()
+                return sol_path, last
+            for h, c, other_path, other_contact in other.ending_at(last):
+                other_contact.append(path)
+            for b in net.adjacency[last]:
+                if b not in search.visited:
+                    new_cost = cost + distance(last, b)
+                    estimate_to_goal = distance(search.goal, b)
+                    search.push((new_cost+estimate_to_goal,
+                                 new_cost,
+                                 path + [b],
+                                 []))
+    return None, None
+
+def right_bidirectional_astar(net):
+    """
+    This version returns the path found, or None.
+    """
+    searches = [search_state(net.start, net.goal, False),
+                search_state(net.goal, net.start, False)]
+    shortest_found = sys.maxint
+    best_path = None
+    while all(s.frontier for s in searches):
+        for search, other in searches, reversed(searches):
+            heuristic, cost, path = search.pop()
+            last = path[-1]
+            if last in search.visited or heuristic > shortest_found:
+                continue
+            search.visited.add(last)
+            for h, c, other_path in other.ending_at(last):
+                length = cost + c
+                if length < shortest_found:
+                    shortest_found = length
+                    best_path = path, other_path
+            for b in net.adjacency[last]:
+                if b not in search.visited:
+                    new_cost = cost + distance(last, b)
+                    estimate_to_goal = distance(search.goal, b)
+                    heuristic = new_cost + estimate_to_goal
+                    if heuristic < shortest_found:
+                        search.push((heuristic,
+                                     new_cost,
+                                     path + [b]))
+    if best_path is None:
+        return None
+    else:
+        a, b = best_path
+        ret = a[:-1] + list(reversed(b))
+        if ret[0] is not net.start:
+            ret.reverse()
+        return ret
+
+class lpastar:
+    """
+    Lifelong Planning A* (Koenig, Likhachev and Furcy), from the start to
+    the goal of a network.
+
+    Every vertex has `g`, its cost from the start as last computed, and
+    `rhs`, what it would be given the `g` of its neighbors, and `parent`,
+    the neighbor `rhs` comes through.  Vertices where `g` and `rhs` differ
+    are queued, by the lowest cost of a path through them that they could
+    be part of, and `path()` fixes them in that order until the goal's cost
+    is known, and then follows the parents back from the goal.  After
+    editing the network, tell the search about it with `edge_changed`,
+    `vertex_moved` or `vertex_deleted`, and only the vertices whose costs
+    the edit changes are looked at again.
+
+    Edges cost their length, except that edges with no length cost
+    `epsilon`: otherwise, coincident vertices could go on propping up each
+    other's costs after the path to them is cut.  The heuristic is the
+    distance to the goal, so when the goal moves, the search starts over.
+    """
+    def __init__(self, net):
+        self.net = net
+        self.reset()
+
+    def reset(self):
+        self.g = {}
+        self.rhs = {self.net.start: 0}
+        self.parent = {}
+        # Heap of (key, vertex), with `queued` mapping each vertex that
+        # should be in it to its current key; other entries are stale.
+        self.queue = []
+        self.queued = {}
+        self.expansions = 0
+        self.enqueue(self.net.start)
+
+    def key(self, v):
+        cost = min(self.g.get(v, inf), self.rhs.get(v, inf))
+        return cost + distance(v, self.net.goal), cost
+
+    def enqueue(self, v):
+        key = self.key(v)
+        self.queued[v] = key
+        heappush(self.queue, (key, id(v), v))
+
+    def update_vertex(self, v):
+        if v is not self.net.start:
+            g = self.g
+            rhs, parent = min([(g.get(n, inf) + cost(n, v), n)
+                               for n in self.net.adjacency[v]]
+                              or [(inf, None)],
+                              key=(lambda (rhs, n): rhs))
+            if rhs == inf:
+                self.rhs.pop(v, None)
+                self.parent.pop(v, None)
+            else:
+                self.rhs[v] = rhs
+                self.parent[v] = parent
+        if self.g.get(v, inf) != self.rhs.get(v, inf):
+            self.enqueue(v)
+        else:
+            self.queued.pop(v, None)
+
+    def top(self):
+        "Return the lowest (key, vertex) in the queue, or None."
+        queue = self.queue
+        while queue:
+            key, id_, v = queue[0]
+            if self.queued.get(v) == key:
+                return key, v
+            heappop(queue)
+        return None
+
+    def compute(self):
+        goal = self.net.goal
+        g = self.g
+        rhs = self.rhs
+        adjacency = self.net.adjacency
+        while True:
+            top = self.top()
+            if top is None:
+                return
+            key, v = top
+            # Rounding can make the key of a vertex on the path come out
+            # as high as the goal's, so stop only well past it; `path`
+            # follows parents, and they must all be up to date.
+            if (key[0] > self.key(goal)[0] + epsilon
+                and g.get(goal, inf) == rhs.get(goal, inf)):
+                return
+            heappop(self.queue)
+            del self.queued[v]
+            self.expansions += 1
+            if g.get(v, inf) > rhs.get(v, inf):
+                g[v] = rhs[v]
+            else:
+                g.pop(v, None)
+                self.update_vertex(v)
+            for n in adjacency[v]:
+                self.update_vertex(n)
+
+    def edge_changed(self, a, b):
+        "Tell the search an edge between `a` and `b` was added or removed."
+        self.update_vertex(a)
+        self.update_vertex(b)
+
+    def vertex_moved(self, v):
+        if v is self.net.goal:
+            self.reset()
+            return
+        self.update_vertex(v)
+        for n in self.net.adjacency[v]:
+            self.update_vertex(n)
+
+    def vertex_deleted(self, v, neighbors):
+        "Tell the search `v` was deleted, and which were its neighbors."
+        for d in self.g, self.rhs, self.parent, self.queued:
+            d.pop(v, None)
+        for n in neighbors:
+            self.update_vertex(n)
+
+    def path(self):
+        "Return a shortest path from the start to the goal, or None."
+        self.compute()
+        v = self.net.goal
+        if v not in self.g:
+            return None
+        ret = [v]
+        while v is not self.net.start:
+            v = self.parent[v]
+            ret.append(v)
+        ret.reverse()
+        return ret
+
+def network_data(net, key=id):
+    """
+    Return `net` as a dict, with `key(v)` as the id of each vertex (by
+    default, the id of the object), in the format save_network pickles.
+    """
+    sv = dict((key(v), (v.x, v.y)) for v in net.vertices)
+    se = [(key(a), key(b)) for a, b in net.edges]
+    return dict(start=key(net.start),
+                goal=key(net.goal),
+                vertices=sv,
+                edges=se)
+
+def save_network(net, filename, key=id):
+    "Pickle `net` to `filename` (see network_data), so ceb.py can load it."
+    pickle.dump(network_data(net, key), file(filename, 'w'))
+
+def check_paths(net, optimal_path, bidi_path, key=id):
+    """
+    Complain, and save the network, if the path wrong_bidirectional_astar
+    found doesn't cost the same as the optimal one.
+    """
+    if optimal_path and bidi_path:
+        bipc = path_cost(bidi_path)
+        oppc = path_cost(optimal_path)
+        if bipc > oppc + epsilon:
+            print "FOUND A COUNTEREXAMPLE!"
+            print "Bidirectional search is settling for a path of length",
+            print bipc, "when one of", oppc, "is available."
+            save_network(net, "counterexample.net", key)
+        if bipc < oppc - epsilon:
+            print "FOUND AN ANOMALY!"
+            print "Bidirectional search seems to be beating plain A*",
+            print bipc, "to", oppc, ".  Fix this!"
+            save_network(net, "anomaly.net", key)
+
+def snapshot(net, key=id):
+    """
+    Describe `net` in terms of vertex ids, as the message that starts a
+    background_search.
+    """
+    return ('snapshot',
+            key(net.start),
+            key(net.goal),
+            [(key(v), v.x, v.y) for v in net.vertices],
+            [(key(a), key(b)) for a, b in net.edges])
+
+def serve(connection):
+    """
+    Search the network described by the messages from `connection`, and
+    send back the results, until told to stop.
+
+    The first message is a `snapshot`, and then come lists of edits, and
+    None to stop:
+
+        ('add_vertex', id, x, y)
+        ('move', id, x, y)
+        ('delete_vertex', id)
+        ('add_edge', id, id)
+        ('remove_edge', id, id)
+
+    The optimal path is kept by an lpastar.  Messages that arrive while a
+    search runs are all applied before searching again, and only the last
+    of them is answered: the edits in the others are already stale.  The
+    answer to a message is its number, counting from 1, the optimal path,
+    the right bidirectional path, and the path and meeting point of the
+    wrong bidirectional search, all in terms of vertex ids, and a list of
+    the tracebacks of the searches that failed, whose paths are None.  If
+    the lpastar fails, it starts over on the next message.
+    """
+    by_id = {}
+    net = lpa = None
+    received = 0
+    def ids(path):
+        return path and [v.id for v in path]
+    while True:
+        messages = [connection.recv()]
+        while connection.poll():
+            messages.append(connection.recv())
+        for message in messages:
+            if message is None:
+                return
+            received += 1
+            if message[0] == 'snapshot':
+                kind, start, goal, vertices, edges = message
+                by_id = dict((id_, point(id_, x, y))
+                             for id_, x, y in vertices)
+                net = network(by_id[start], by_id[goal], by_id.values(),
+                              [(by_id[a], by_id[b]) for a, b in edges])
+                lpa = lpastar(net)
+                continue
+            for edit in message:
+                kind = edit[0]
+                if kind == 'add_vertex':
+                    v = by_id[edit[1]] = point(*edit[1:])
+                    net.add_vertex(v)
+                elif kind == 'move':
+                    v = by_id[edit[1]]
+                    v.x, v.y = edit[2:]
+                    lpa.vertex_moved(v)
+                elif kind == 'delete_vertex':
+                    v = by_id.pop(edit[1])
+                    lpa.vertex_deleted(v, net.delete_vertex(v))
+                elif kind in ['add_edge', 'remove_edge']:
+                    a, b = by_id[edit[1]], by_id[edit[2]]
+                    getattr(net, kind)(a, b)
+                    lpa.edge_changed(a, b)
+        errors = []
+        optimal_path = attempt(errors, lpa.path)
+        if errors:
+            lpa = lpastar(net)
+        right_bidi_path = attempt(errors, right_bidirectional_astar, net)
+        bidi_path, meeting_point = (attempt(errors,
+                                            wrong_bidirectional_astar, net)
+                                    or (None, None))
+        check_paths(net, optimal_path, bidi_path, key=(lambda v: v.id))
+        connection.send((received,
+                         ids(optimal_path),
+                         ids(right_bidi_path),
+                         ids(bidi_path),
+                         meeting_point and meeting_point.id,
+                         errors))
+
+def attempt(errors, search, *args):
+    """
+    Return `search(*args)`, or if it raises, None, and add the traceback
+    to `errors`.
+    """
+    try:
+        return search(*args)
+    except Exception:
+        errors.append(traceback.format_exc())
+        return None
+
+class background_search:
+    """
+    Search a network in another process.
+
+    Tell it about edits to the network with `edits`, in the format `serve`
+    expects, and collect the paths with `result`, which never waits.  The
+    vertices are told apart by `key` (by default, the id of the object).
+
+    If the process dies, that's reported, and another one is started from
+    a snapshot of the network with the next edits.
+    """
+    def __init__(self, net, key=id):
+        self.net = net
+        self.key = key
+        self.start()
+
+    def start(self):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve, args=(child,))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.connection.send(snapshot(self.net, self.key))
+        self.sent = 1
+
+    def gone(self):
+        "Forget the process, which has died."
+        print "The background search died."
+        self.connection.close()
+        self.connection = None
+        self.process.join()
+
+    def edits(self, edits):
+        """
+        Send `edits`, which must have been made to the network already:
+        if the process has to be started again, they're in its snapshot.
+        """
+        if not edits:
+            return
+        if self.connection is None:
+            self.start()
+            return
+        try:
+            self.connection.send(edits)
+            self.sent += 1
+        except IOError:
+            self.gone()
+            self.start()
+
+    def result(self):
+        """
+        Return the latest answer ready (see `serve`), or None if there's no
+        new one.  If the number in it is lower than `sent`, it's for an
+        earlier state of the network, and newer answers are on their way.
+        """
+        ret = None
+        try:
+            while self.connection is not None and self.connection.poll():
+                ret = self.connection.recv()
+        except (EOFError, IOError):
+            self.gone()
+        return ret
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.send(None)
+            except IOError:
+                pass
+            self.connection.close()
+            self.process.join()
@@ -0,0 +1,99 @@
+"""
+Find the item closest to a point among many, without looking at them all.
+
+ceb.py picks vertices and edges with these; they are kept apart from the
+editor so they can be used without a window.
+"""
+
+from __future__ import division
+
+
+class grid_hash:
+    """
+    Items are bucketed by the square cell of side `cell_size` that their
+    `position(item)` falls in.  The closest one is looked for in the cells
+    around the point, ring by ring, until no closer item can be found in
+    the next ring.
+
+    Tell the index when an item moves with `move`.  Items equal to each
+    other are kept once per time they are added, and `remove` removes one
+    of them.
+    """
+    def __init__(self, position, items=(), cell_size=32):
+        self.position = position
+        self.cell_size = cell_size
+        # Lists of items by cell, and of the cells of each copy of an item.
+        self.cells = {}
+        self.cell_of = {}
+        # Bounds of the cells ever used; no need to look beyond them.
+        self.min_cell = self.max_cell = None
+        for item in items:
+            self.add(item)
+
+    def cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, item):
+        cell = self.cell(*self.position(item))
+        self.cells.setdefault(cell, []).append(item)
+        self.cell_of.setdefault(item, []).append(cell)
+        if self.min_cell is None:
+            self.min_cell = self.max_cell = cell
+        else:
+            self.min_cell = map(min, self.min_cell, cell)
+            self.max_cell = map(max, self.max_cell, cell)
+
+    def remove(self, item):
+        cells = self.cell_of[item]
+        cell = cells.pop()
+        if not cells:
+            del self.cell_of[item]
+        items = self.cells[cell]
+        items.remove(item)
+        if not items:
+            del self.cells[cell]
+
+    def move(self, item):
+        "Put every copy of `item` in the cell it's in now."
+        cell = self.cell(*self.position(item))
+        copies = len(self.cell_of[item])
+        if self.cell_of[item] != [cell] * copies:
+            for i in xrange(copies):
+                self.remove(item)
+            for i in xrange(copies):
+                self.add(item)
+
+    def closest(self, p, exclude=None):
+        """
+        Return the item closest to `p` that is not `exclude`, or None if
+        there is none.
+        """
+        if self.min_cell is None:
+            return None
+        cells = self.cells
+        position = self.position
+        ci, cj = self.cell(p.x, p.y)
+        max_ring = max(ci - self.min_cell[0], self.max_cell[0] - ci,
+                       cj - self.min_cell[1], self.max_cell[1] - cj)
+        best = None
+        best_d2 = None
+        for ring in xrange(max_ring + 1):
+            for i in xrange(ci - ring, ci + ring + 1):
+                # All of the top and bottom rows of the ring, just the ends
+                # of the others.
+                step = 1 if i in (ci - ring, ci + ring) else 2 * ring or 1
+                for j in xrange(cj - ring, cj + ring + 1, step):
+                    for item in cells.get((i, j), ()):
+                        if item is exclude:
+                            continue
+                        x, y = position(item)
+                        dx = x - p.x
+                        dy = y - p.y
+                        d2 = dx * dx + dy * dy
+                        if best_d2 is None or d2 < best_d2:
+                            best = item
+                            best_d2 = d2
+            # Items in further rings are at least this far away.
+            if best_d2 is not None and best_d2 <= (ring * self.cell_size) ** 2:
+                break
+        return best
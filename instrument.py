@@ -0,0 +1,186 @@
+"""
+Opt-in instrumentation for the searches in search.py and wordchain.py.
+
+Pass a `search_stats` as the `stats` argument of a search to have it count
+what it does.  Searches run without one pay only for a few `is None` checks.
+
+    stats = search_stats()
+    search.astar_search(problem, log, stats)
+    print stats.summary()
+
+If `per_step` is set, the counters as of the start of each step are also
+written to the search history, as a command of the form
+
+    stats <name>=<value> [<name>=<value> ...]
+
+right after the corresponding `step` command.  searchview ignores these, but
+keeps them around in the parsed history.
+
+There are also two ways to profile a single search: `profiled` runs it under
+cProfile, and `sampler` periodically records the Python stack while it runs.
+"""
+
+from __future__ import division
+
+from collections import defaultdict
+import cProfile
+import pstats
+import signal
+import sys
+import time
+
+
+class search_stats:
+
+    counter_names = ['expansions',
+                     'generated',
+                     'pushes',
+                     'duplicate_pushes',
+                     'pops',
+                     'visited_hits',
+                     'peak_frontier',
+                     'log_calls']
+
+    def __init__(self, per_step=False):
+        """
+        If `per_step` is True, write the counters to the search history at
+        the start of every step.
+        """
+        self.per_step = per_step
+        for name in self.counter_names:
+            setattr(self, name, 0)
+        self.log_time = 0.
+        self.expand_time = 0.
+        self.steps = []
+        # Keys pushed in the current search, to spot duplicate pushes.
+        self.pushed = set()
+
+    def counters(self):
+        return dict((name, getattr(self, name)) for name in self.counter_names)
+
+    def push(self, key, frontier_size):
+        """
+        Record that the node identified by `key` was added to a frontier,
+        which then had `frontier_size` entries.  It's a duplicate push if
+        it was already pushed since the search started (see `wrap_log`).
+        """
+        self.pushes += 1
+        if key in self.pushed:
+            self.duplicate_pushes += 1
+        else:
+            self.pushed.add(key)
+        if frontier_size > self.peak_frontier:
+            self.peak_frontier = frontier_size
+
+    def pop(self):
+        self.pops += 1
+
+    def visited_hit(self):
+        "Record a lookup that found a node already in a visited set."
+        self.visited_hits += 1
+
+    def wrap_expand(self, expand):
+        """
+        Return a version of `expand` that returns its children as a list and
+        keeps count of expansions, generated children and time spent.
+        """
+        def wrapper(*args):
+            begin = time.time()
+            children = list(expand(*args))
+            self.expand_time += time.time() - begin
+            self.expansions += 1
+            self.generated += len(children)
+            return children
+        return wrapper
+
+    def wrap_problem(self, problem):
+        return instrumented_problem(problem, self.wrap_expand(problem.expand))
+
+    def wrap_log(self, log):
+        """
+        Return a version of `log` that keeps count of its calls and time.
+
+        Searches wrap their log once, as they start, so this also forgets
+        the keys pushed by earlier searches: the counters add up over many
+        searches, but the keys of only one are kept.
+        """
+        self.pushed = set()
+        def wrapper(*args):
+            begin = time.time()
+            log(*args)
+            if args[0] == 'step':
+                self.steps.append(self.counters())
+                if self.per_step:
+                    log('stats', *('%s=%s' % item
+                                   for item in sorted(self.steps[-1].items())))
+            self.log_time += time.time() - begin
+            self.log_calls += 1
+        return wrapper
+
+    def summary(self):
+        ret = self.counters()
+        ret.update(heap_operations=self.pushes + self.pops,
+                   log_time=self.log_time,
+                   expand_time=self.expand_time,
+                   steps=len(self.steps))
+        return ret
+
+class instrumented_problem:
+    "A search problem whose `expand` has been wrapped by a `search_stats`."
+    def __init__(self, problem, expand):
+        self.problem = problem
+        self.expand = expand
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+def profiled(fn, *args, **kw):
+    """
+    Call `fn(*args, **kw)` under cProfile and return (result, profile).
+
+    The returned `profile` is a `pstats.Stats`; `profile.print_stats(20)` and
+    `profile.dump_stats(filename)` are probably what you want to do with it.
+    """
+    profile = cProfile.Profile()
+    ret = profile.runcall(fn, *args, **kw)
+    return ret, pstats.Stats(profile)
+
+class sampler:
+    """
+    Statistical profiler.  While active, it samples the Python stack every
+    `interval` seconds of CPU time.
+
+        with sampler() as s:
+            search.astar_search(problem, log)
+        s.write_collapsed(file('astar.stacks', 'w'))
+
+    The output is in the 'collapsed stacks' format that flame graph tools
+    read: one line per distinct stack, with its frames separated by
+    semicolons, followed by the number of samples that hit it.
+
+    This uses SIGPROF, so it only works in the main thread.
+    """
+    def __init__(self, interval=.001, depth=20):
+        self.interval = interval
+        self.depth = depth
+        self.samples = defaultdict(int)
+    def __enter__(self):
+        self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+    def __exit__(self, *exc_info):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler)
+    def sample(self, signum, frame):
+        stack = []
+        while frame is not None and len(stack) < self.depth:
+            code = frame.f_code
+            stack.append("%s:%s:%d" % (code.co_filename,
+                                       code.co_name,
+                                       frame.f_lineno))
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[';'.join(stack)] += 1
+    def write_collapsed(self, out=sys.stdout):
+        for stack, count in sorted(self.samples.iteritems(),
+                                   key=(lambda (s, c): -c)):
+            out.write("%s %d\n" % (stack, count))
@@ -0,0 +1,384 @@
+"""
+Multilevel force directed graph layout, in NumPy.
+
+This does roughly what graphviz's sfdp does, without graphviz:
+
+    - The graph is coarsened repeatedly, by merging the endpoints of a
+      random maximal matching of its edges, until it's small or stops
+      shrinking.
+    - The coarsest graph is laid out from random positions, and each finer
+      graph starts from the positions of the vertices it was merged into,
+      then is refined with fewer iterations.
+    - Forces are those of the spring-electrical model: edges pull their
+      endpoints together with a force of d^2 / K, and every pair of
+      vertices repels with a force of C * K^2 / d, where K is the natural
+      edge length.  A weak pull towards the center keeps disconnected
+      components from drifting away.
+    - Repulsion is approximated Barnes-Hut style: vertices are binned into a
+      pyramid of grids.  Each cell is repelled by the centers of mass of the
+      cells in its interaction list (the children of its parent's
+      neighbors that aren't its own neighbors), and that force is applied
+      to every vertex in the cell; only vertices in neighboring cells of
+      the finest grid repel each other directly.
+
+All vertices move at once each iteration, with the adaptive step length
+control of Hu's "Efficient and high quality force-directed graph drawing".
+
+    positions = layout(edges)
+
+returns a dict mapping every vertex in `edges` to an (x, y) tuple.
+
+`incremental_layout` lays out a graph reusing the positions some of its
+vertices have in another layout, e.g. to show a part of a big graph the way
+it looks in the whole.
+"""
+
+from __future__ import division
+
+import numpy
+
+
+repulsion = .2
+gravity = .01
+# Stop coarsening at this many vertices, or when a level shrinks by less
+# than this ratio.
+coarsest_size = 64
+min_shrink = .8
+# Side of the cells of the finest grid, in natural edge lengths, and the
+# most levels the grid pyramid can have (the finest grid has 4^max_depth
+# cells).
+cell_size = 2.
+cell_occupancy = 4
+max_depth = 11
+# Scale of the output coordinates, per unit of natural edge length.
+scale = 20.
+
+def layout(edges, iterations=30, seed=0):
+    """
+    Lay out the graph with the given edges, as (vertex, vertex) pairs.
+
+    `iterations` is the number of force iterations run on each level, but
+    the coarsest, which gets four times as many.  The same seed always
+    gives the same layout.
+    """
+    ids = {}
+    ends = []
+    for a, b in edges:
+        if a != b:
+            ends.append(ids.setdefault(a, len(ids)))
+            ends.append(ids.setdefault(b, len(ids)))
+    n = len(ids)
+    pairs = numpy.array(ends, dtype=numpy.intp).reshape(-1, 2)
+    rng = numpy.random.RandomState(seed)
+    positions = multilevel_layout(n, unique_edges(pairs), iterations, rng)
+    positions *= scale
+    names = [None] * n
+    for id_, i in ids.iteritems():
+        names[i] = id_
+    return dict(zip(names, map(tuple, positions.tolist())))
+
+def incremental_layout(edges, fixed, iterations=15, seed=0):
+    """
+    Lay out the graph with the given edges, keeping the vertices that are in
+    `fixed` (a dict from vertex to (x, y), like the output of `layout`) where
+    they are there.
+
+    Only the rest of the vertices are placed: first at the center of their
+    neighbors that already have a place, then refined by `iterations` force
+    iterations in which nothing else moves.  Vertices that can't be reached
+    from a fixed one are placed at random around the center of the fixed
+    ones.  The natural edge length is taken from the fixed edges.
+    """
+    ids = {}
+    ends = []
+    for a, b in edges:
+        if a != b:
+            ends.append(ids.setdefault(a, len(ids)))
+            ends.append(ids.setdefault(b, len(ids)))
+    n = len(ids)
+    names = [None] * n
+    for id_, i in ids.iteritems():
+        names[i] = id_
+    known = numpy.array([name in fixed for name in names], dtype=bool)
+    if not known.any():
+        return layout(edges, iterations, seed)
+    pairs = unique_edges(numpy.array(ends, dtype=numpy.intp).reshape(-1, 2))
+    rng = numpy.random.RandomState(seed)
+    positions = numpy.zeros((n, 2))
+    positions[known] = [fixed[name] for name, k in zip(names, known) if k]
+    both = known[pairs[:, 0]] & known[pairs[:, 1]]
+    if both.any():
+        delta = positions[pairs[both, 1]] - positions[pairs[both, 0]]
+        length = numpy.median(numpy.sqrt((delta ** 2).sum(axis=1)))
+    else:
+        length = scale
+    length = length or scale
+    positions /= length
+
+    # Place new vertices next to their placed neighbors, layer by layer.
+    placed = known.copy()
+    while True:
+        a = pairs[:, 0]
+        b = pairs[:, 1]
+        frontier = numpy.concatenate([a[placed[b] & ~placed[a]],
+                                      b[placed[a] & ~placed[b]]])
+        if not len(frontier):
+            break
+        sources = numpy.concatenate([b[placed[b] & ~placed[a]],
+                                     a[placed[a] & ~placed[b]]])
+        counts = numpy.bincount(frontier, minlength=n)
+        new = numpy.nonzero(counts)[0]
+        for axis in 0, 1:
+            sums = numpy.bincount(frontier, positions[sources, axis], n)
+            positions[new, axis] = sums[new] / counts[new]
+        positions[new] += rng.uniform(-.5, .5, (len(new), 2))
+        placed[new] = True
+    lost = ~placed
+    if lost.any():
+        center = positions[known].mean(axis=0)
+        spread = max(1., (~known).sum() ** .5)
+        positions[lost] = center + rng.uniform(-spread, spread,
+                                               (lost.sum(), 2))
+    if not known.all():
+        positions = refine(positions, pairs, iterations, .5, ~known)
+    positions *= length
+    ret = dict(zip(names, map(tuple, positions.tolist())))
+    # Exactly as given, not rescaled.
+    for name, k in zip(names, known):
+        if k:
+            ret[name] = fixed[name]
+    return ret
+
+def unique_edges(pairs):
+    "Edges without self loops or repetitions, whatever their direction."
+    if not len(pairs):
+        return pairs
+    pairs = numpy.sort(pairs, axis=1)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    if not len(pairs):
+        return pairs
+    n = pairs.max() + 1
+    keys = numpy.unique(pairs[:, 0] * n + pairs[:, 1])
+    return numpy.column_stack([keys // n, keys % n])
+
+def coarsen(n, pairs, rng):
+    """
+    Merge the endpoints of a random maximal matching of the edges.
+
+    Return the number of coarse vertices, the coarse edges and an array
+    with the coarse vertex each vertex was merged into.
+    """
+    parent = [-1] * n
+    count = 0
+    pairs_list = pairs[rng.permutation(len(pairs))].tolist()
+    for a, b in pairs_list:
+        if parent[a] < 0 and parent[b] < 0:
+            parent[a] = parent[b] = count
+            count += 1
+    # Vertices left out of the matching join the group of a neighbor, so
+    # that stars and long tails shrink too.
+    for a, b in pairs_list:
+        if parent[a] < 0:
+            parent[a] = parent[b]
+        elif parent[b] < 0:
+            parent[b] = parent[a]
+    # What's left has no edges; pair those up arbitrarily.
+    lonely = [i for i in xrange(n) if parent[i] < 0]
+    for k, i in enumerate(lonely):
+        parent[i] = count + k // 2
+    count += (len(lonely) + 1) // 2
+    parent = numpy.array(parent, dtype=numpy.intp)
+    return count, unique_edges(parent[pairs]), parent
+
+def multilevel_layout(n, pairs, iterations, rng):
+    if n == 0:
+        return numpy.zeros((0, 2))
+    levels = [(n, pairs, None)]
+    while levels[-1][0] > coarsest_size:
+        count, coarse_pairs, parent = coarsen(*(levels[-1][:2] + (rng,)))
+        if count > min_shrink * levels[-1][0]:
+            break
+        levels[-1] = levels[-1][:2] + (parent,)
+        levels.append((count, coarse_pairs, None))
+    # Random start for the coarsest level, with room for its vertices.
+    count, pairs, parent = levels.pop()
+    positions = rng.uniform(0, count ** .5, (count, 2))
+    positions = refine(positions, pairs, 4 * iterations, count ** .5 / 5)
+    while levels:
+        fine_count, pairs, parent = levels.pop()
+        # A finer level takes more room.
+        positions = positions * (fine_count / count) ** .5
+        positions = positions[parent] + rng.uniform(-.1, .1, (fine_count, 2))
+        count = fine_count
+        positions = refine(positions, pairs, iterations, 1.)
+    return positions
+
+def refine(positions, pairs, iterations, step, movable=None):
+    """
+    Run `iterations` force iterations, with adaptive step length.  If
+    `movable` is given, only the vertices where it's true move.
+    """
+    energy = float('inf')
+    progress = 0
+    for i in xrange(iterations):
+        forces = attraction(positions, pairs)
+        forces += repulsion_forces(positions)
+        forces -= gravity * (positions - positions.mean(axis=0))
+        if movable is not None:
+            forces[~movable] = 0
+        magnitudes = numpy.sqrt((forces ** 2).sum(axis=1))
+        new_energy = (magnitudes ** 2).sum()
+        positions = positions + (step * forces
+                                 / numpy.maximum(magnitudes, 1e-9)[:, None])
+        if new_energy < energy:
+            progress += 1
+            if progress >= 5:
+                progress = 0
+                step /= .9
+        else:
+            progress = 0
+            step *= .9
+        energy = new_energy
+    return positions
+
+def attraction(positions, pairs):
+    n = len(positions)
+    forces = numpy.zeros((n, 2))
+    if not len(pairs):
+        return forces
+    a = pairs[:, 0]
+    b = pairs[:, 1]
+    delta = positions[b] - positions[a]
+    # d^2 along the unit vector is d * delta.
+    pull = delta * numpy.sqrt((delta ** 2).sum(axis=1))[:, None]
+    for axis in 0, 1:
+        forces[:, axis] += numpy.bincount(a, pull[:, axis], n)
+        forces[:, axis] -= numpy.bincount(b, pull[:, axis], n)
+    return forces
+
+def repel(delta, mass):
+    """
+    Repulsion on the points at `delta` from a mass `mass` (at the origin,
+    in the direction of `delta`).
+    """
+    distance2 = numpy.maximum((delta ** 2).sum(axis=1), 1e-6)
+    return delta * (repulsion * mass / distance2)[:, None]
+
+# Offsets of the cells in the interaction list of a cell, by the parity of
+# its coordinates (as 2 * (x % 2) + y % 2): the children of the neighbors
+# of its parent that aren't neighbors of the cell itself.
+interaction_offsets = numpy.array([
+        [(ox, oy)
+         for ox in xrange(-2 - px, 4 - px)
+         for oy in xrange(-2 - py, 4 - py)
+         if abs(ox) > 1 or abs(oy) > 1]
+        for px in (0, 1)
+        for py in (0, 1)])
+
+# A cell and half of its neighbors.
+half_neighbor_offsets = [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+def repulsion_forces(positions):
+    n = len(positions)
+    forces = numpy.zeros((n, 2))
+    if n < 2:
+        return forces
+    low = positions.min(axis=0)
+    size = max((positions.max(axis=0) - low).max(), 1e-9) * (1 + 1e-9)
+    unit = (positions - low) / size
+    # The finest cells are about `cell_size` across, whatever the extent of
+    # the layout, so the number of vertices in each stays small where edges
+    # have their natural length.  They are at least as many as needed for
+    # `cell_occupancy` vertices each, in case the layout is denser than
+    # that, and not many more than vertices.
+    depth = max(numpy.log2(size / cell_size),
+                numpy.log(n / cell_occupancy) / numpy.log(4))
+    depth = int(numpy.clip(numpy.ceil(depth),
+                           1, min(max_depth, numpy.log2(n) / 2 + 2)))
+    for level in xrange(2, depth + 1):
+        side = 2 ** level
+        cells = numpy.floor(unit * side).astype(numpy.intp)
+        flat = cells[:, 0] * side + cells[:, 1]
+        mass = numpy.bincount(flat, minlength=side * side)
+        occupied = numpy.nonzero(mass)[0]
+        m = mass[occupied]
+        centers = numpy.zeros((side * side, 2))
+        for axis in 0, 1:
+            centers[occupied, axis] = numpy.bincount(flat, positions[:, axis],
+                                                     side * side)[occupied] / m
+        cx = occupied // side
+        cy = occupied % side
+        offsets = interaction_offsets[2 * (cx % 2) + cy % 2]
+        tx = (cx[:, None] + offsets[:, :, 0]).ravel()
+        ty = (cy[:, None] + offsets[:, :, 1]).ravel()
+        source = numpy.repeat(numpy.arange(len(occupied)), offsets.shape[1])
+        inside = (tx >= 0) & (tx < side) & (ty >= 0) & (ty < side)
+        source = source[inside]
+        target = tx[inside] * side + ty[inside]
+        target_mass = mass[target]
+        keep = target_mass > 0
+        source = source[keep]
+        target = target[keep]
+        pushes = repel(centers[occupied[source]] - centers[target],
+                       target_mass[keep])
+        cell_forces = numpy.zeros((side * side, 2))
+        for axis in 0, 1:
+            cell_forces[occupied, axis] = numpy.bincount(
+                    source, pushes[:, axis], len(occupied))
+        forces += cell_forces[flat]
+
+    # Direct repulsion between vertices in neighboring cells of the finest
+    # grid.  Each pair of cells is visited once (the cell itself and the
+    # neighbors on one side), and pushes both vertices apart.  Vertices are
+    # handled sorted by cell, so those in a cell are contiguous.
+    side = 2 ** depth
+    cells = numpy.floor(unit * side).astype(numpy.intp)
+    flat = cells[:, 0] * side + cells[:, 1]
+    order = numpy.argsort(flat, kind='mergesort')
+    counts = numpy.bincount(flat, minlength=side * side)
+    starts = numpy.cumsum(counts) - counts
+    sorted_cells = cells[order]
+    xs = positions[order, 0]
+    ys = positions[order, 1]
+    fx = numpy.zeros(n)
+    fy = numpy.zeros(n)
+    for ox, oy in half_neighbor_offsets:
+        tx = sorted_cells[:, 0] + ox
+        ty = sorted_cells[:, 1] + oy
+        inside = (tx >= 0) & (tx < side) & (ty >= 0) & (ty < side)
+        sources = numpy.nonzero(inside)[0]
+        target_cells = tx[inside] * side + ty[inside]
+        lengths = counts[target_cells]
+        total = lengths.sum()
+        if not total:
+            continue
+        # Every vertex in `sources` against every vertex in its target cell.
+        a = numpy.repeat(sources, lengths)
+        segment_starts = numpy.cumsum(lengths) - lengths
+        b = (numpy.arange(total)
+             - numpy.repeat(segment_starts - starts[target_cells], lengths))
+        if ox == oy == 0:
+            # Within a cell, each pair once.
+            keep = a < b
+            a = a[keep]
+            b = b[keep]
+        dx = xs[a] - xs[b]
+        dy = ys[a] - ys[b]
+        push = repulsion / numpy.maximum(dx * dx + dy * dy, 1e-6)
+        dx *= push
+        dy *= push
+        fx += numpy.bincount(a, dx, n) - numpy.bincount(b, dx, n)
+        fy += numpy.bincount(a, dy, n) - numpy.bincount(b, dy, n)
+    forces[order, 0] += fx
+    forces[order, 1] += fy
+    return forces
+
+def layout_vertices(edges, iterations=30, seed=0):
+    """
+    Same interface and output as makegraph.layout_graph: (id, x, y) string
+    triples for every vertex in `edges`, with `id` the vertex's string
+    representation.
+    """
+    positions = layout(((str(a), str(b)) for a, b in edges), iterations, seed)
+    return ((id_, '%.1f' % x, '%.1f' % y)
+            for id_, (x, y) in positions.iteritems())
@@ -1,10 +1,15 @@
 from __future__ import division
 
+from array import array
+from collections import defaultdict
+from heapq import merge
 from itertools import *
 ichain = chain.from_iterable
+import multiprocessing
 import random
+import string
+import tempfile
 
-import gv
 import wordchain as wc
 
 
@@ -60,6 +65,9 @@ def layout_graph(edges):
     referred to in searchview.py '*.history' description files.
     """
 
+    # Only needed here; importing it lazily keeps `import makegraph` cheap.
+    import gv
+
     print "Adding edges to graphviz..."
     graph = gv.strictgraph('graph')
     for a, b in edges:
@@ -81,19 +89,106 @@ def layout_graph(edges):
                   + gv.getv(gv.findnode(graph, name), 'pos').split(","))
             for name in vertex_names)
 
-def get_edges():
+# Sorted words of the dictionary edge_worker finds edges in.  Set before
+# the pool is started, so the workers inherit it.
+_words = None
+_dictionary = None
+letters = frozenset(string.lowercase)
+
+def edge_worker((part, parts)):
+    """
+    Return this worker's share of the edges between the words in `_words`
+    that are a single edit (see wordchain.single_edits) away from each
+    other, as a list of (a, b) pairs with a < b.
+
+    A substitution joins two words of the same length that match the same
+    wildcard pattern (the word with one letter blanked out), at least one
+    of which has a lowercase letter there.  Two words can only share one
+    such pattern, so each worker takes the patterns whose hash is `part`
+    modulo `parts` and gets every substitution in them exactly once.
+
+    Insertions are deletions the other way round: each worker takes every
+    `parts`th word and joins it to the words it has a single deletion of.
+    """
+    words = _words
+    dictionary = _dictionary
+    buckets = defaultdict(list)
+    for word in words:
+        for i in xrange(len(word)):
+            pattern = word[:i] + '\0' + word[i+1:]
+            if hash(pattern) % parts == part:
+                buckets[pattern].append(word)
+    ret = []
+    for pattern, bucket in buckets.iteritems():
+        if len(bucket) < 2:
+            continue
+        i = pattern.index('\0')
+        for j, a in enumerate(bucket):
+            for b in islice(bucket, j + 1, None):
+                if a[i] in letters or b[i] in letters:
+                    ret.append((a, b))
+    for word in islice(words, part, None, parts):
+        for deletion in set(word[:i] + word[i+1:] 
+                            for i in xrange(len(word))):
+            if deletion in dictionary:
+                ret.append((deletion, word) if deletion < word
+                           else (word, deletion))
+    return ret
+
+def get_edges(dictionary=None, workers=None):
+    """
+    Generate every edge of the graph of words in `dictionary` (by default,
+    wordchain's) that are a single edit away from each other, once, as
+    (a, b) pairs with a < b.
+
+    The work is split between a pool of `workers` processes (by default,
+    one per CPU; 0 for none), and edges are generated as each worker's
+    share is ready, in no particular order.
+    """
+    global _words, _dictionary
     print "Generating edges..."
-    return [(word, edit)
-             for word in wc.default_dictionary
-             for edit in wc.single_edits(word)
-                 if edit != word
-                 and edit in wc.default_dictionary]
-def test_graph():
-    write_graph(get_edges(), file('graph', 'w'))
+    if dictionary is None:
+        dictionary = wc.default_dictionary()
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    _words = sorted(dictionary)
+    _dictionary = dictionary
+    if workers == 0:
+        for edge in edge_worker((0, 1)):
+            yield edge
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        # A few shares per worker keep them all busy to the end.
+        parts = 4 * workers
+        for edges in pool.imap_unordered(edge_worker, 
+                                         [(part, parts) 
+                                          for part in xrange(parts)]):
+            for edge in edges:
+                yield edge
+    finally:
+        pool.terminate()
+        _words = _dictionary = None
+
+def test_graph(word_graph_filename=None, engine='native', format='text'):
+    """
+    Write the graph of the default dictionary, or the one in a word graph
+    file, to 'graph', or to 'graph.wg' in wordgraph format.
+    """
+    if format == 'wordgraph':
+        out = file('graph.wg', 'wb')
+    else:
+        out = file('graph', 'w')
+    if word_graph_filename:
+        import wordgraph
+        write_word_graph(wordgraph.load(word_graph_filename), out, engine,
+                         format)
+    else:
+        write_graph(get_edges(), out, engine=engine, format=format)
 
 def test_search():
 
-    edges = get_edges()
+    edges = list(get_edges())
 
     def random_vertex():
         return random_edge()[0]
@@ -118,7 +213,135 @@ def test_search():
                 out.write("edge_color %s %s %s\n" % (a, b, color))
 
 
-def write_graph(edges, out):
+# Most integers sorted_keys keeps in memory before spilling them, sorted, to
+# a temporary file.
+run_size = 1 << 20
+# Lines written at a time by write_graph.
+block_lines = 1 << 12
+
+def key_array(values=()):
+    ret = array('L', values)
+    assert ret.itemsize >= 8
+    return ret
+
+class sorted_keys:
+    """
+    A set of integers between 0 and 2^64, added one by one or in bulk,
+    that iterates in increasing order.
+
+    The integers are kept in an array until there are `run_size` of them.
+    Then they are sorted, and written without repetitions to a temporary
+    file, and iterating merges those files.  So memory use doesn't depend
+    on the number of integers.
+    """
+    def __init__(self):
+        self.runs = []
+        self.keys = key_array()
+        self.sorted = True
+
+    def add(self, key):
+        self.keys.append(key)
+        self.sorted = False
+        if len(self.keys) >= run_size:
+            self.spill()
+
+    def extend(self, keys):
+        self.keys.extend(keys)
+        self.sorted = False
+        if len(self.keys) >= run_size:
+            self.spill()
+
+    def spill(self):
+        run = tempfile.TemporaryFile()
+        key_array(unique_sorted(sorted(self.keys))).tofile(run)
+        self.runs.append(run)
+        self.keys = key_array()
+
+    def __iter__(self):
+        if not self.runs:
+            if not self.sorted:
+                self.keys = key_array(unique_sorted(sorted(self.keys)))
+                self.sorted = True
+            return iter(self.keys)
+        if self.keys:
+            self.spill()
+        return unique_sorted(merge(*map(read_run, self.runs)))
+
+def read_run(run):
+    "Yield the integers in a file of sorted_keys."
+    run.seek(0)
+    while True:
+        keys = key_array()
+        try:
+            keys.fromfile(run, block_lines)
+        except EOFError:
+            pass
+        if not keys:
+            return
+        for key in keys:
+            yield key
+
+class edge_set:
+    """
+    The distinct edges in a stream of (a, b) pairs, whatever their
+    direction, and without self loops.
+
+    Vertices are numbered in order of appearance: `names[i]` is the vertex
+    with number `i`.  An edge between `i < j` is kept as the integer
+    `i << 32 | j` in a sorted_keys, so `pairs()` can yield them in order,
+    as (i, j) pairs, and besides the names, memory use doesn't depend on
+    the number of edges.
+    """
+    def __init__(self, edges):
+        ids = {}
+        names = []
+        keys = sorted_keys()
+        for a, b in edges:
+            if a == b:
+                continue
+            i = ids.get(a)
+            if i is None:
+                i = ids[a] = len(names)
+                names.append(a)
+            j = ids.get(b)
+            if j is None:
+                j = ids[b] = len(names)
+                names.append(b)
+            keys.add(i << 32 | j if i < j else j << 32 | i)
+        self.keys = keys
+        self.names = names
+
+    def pairs(self):
+        mask = (1 << 32) - 1
+        for key in self.keys:
+            yield key >> 32, key & mask
+
+    def __iter__(self):
+        "Yield every edge once, as a pair of vertices."
+        names = self.names
+        for i, j in self.pairs():
+            yield names[i], names[j]
+
+def unique_sorted(keys):
+    "Yield the values in a sorted iterable, skipping repetitions."
+    last = None
+    for key in keys:
+        if key != last:
+            yield key
+            last = key
+
+def write_lines(out, lines):
+    "Write an iterable of lines, without newlines, in blocks."
+    lines = iter(lines)
+    while True:
+        block = list(islice(lines, block_lines))
+        if not block:
+            return
+        block.append('')
+        out.write('\n'.join(block))
+
+def write_graph(edges, out, positions=None, engine='native', 
+                format='text'):
     """
     Generate the 2D representation data as searchview expects it.
 
@@ -126,19 +349,75 @@ def write_graph(edges, out):
     function.  This function does normalization of vertex order in edges so
     you don't have to do this yourself.  That is, if you provide both `(a, b)`
     and `(b, a)`, only one edge will be generated.
+
+    If `positions` is given, it maps the string representation of every
+    vertex to its (x, y) coordinates, and no layout is done.  Otherwise the
+    graph is laid out by `engine`: 'native' for layout.py, or 'sfdp' for
+    graphviz (see layout_graph).
+
+    `format` is 'text' for the format above, or 'wordgraph' for a binary
+    wordgraph.py file, with the string representations of the vertices as
+    words; `out` must be open in binary mode then.
+
+    Edges are read once, and kept on disk if there are many of them (see
+    edge_set), but laying them out needs them all in memory.
     """
-    edges = set(imap(frozenset, edges))
-    vertices = layout_graph(edges)
+    edges = edge_set((str(a), str(b)) for a, b in edges)
+    if positions is None and engine == 'sfdp':
+        vertices = layout_graph(list(edges))
+    elif positions is None:
+        import layout
+        print "Laying out..."
+        vertices = layout.layout_vertices(edges)
+    else:
+        vertices = ((id_,) + tuple(positions[id_]) for id_ in edges.names)
+    if format == 'wordgraph':
+        import wordgraph
+        positions = dict((id_, (float(x), float(y))) 
+                         for id_, x, y in vertices)
+        wordgraph.from_pairs(edges.names, edges.pairs(), 
+                             positions).write(out)
+        return
     out.write("begin vertices\n")
-    for id_, x, y in vertices:
-        out.write("%s %s %s\n" % (id_, x, y))
+    write_lines(out, ("%s %s %s" % vertex for vertex in vertices))
     out.write("end vertices\n\nbegin edges\n")
-    for a, b in edges:
-        out.write("%s %s\n" % (a, b))
+    write_lines(out, ("%s %s" % edge for edge in edges))
     out.write("end edges\n")
 
+def read_positions(filename):
+    """
+    Return a dict from vertex id to (x, y) with the layout in a graph file
+    written by write_graph.
+    """
+    ret = {}
+    lines = imap(str.strip, file(filename))
+    for line in lines:
+        if line == 'begin vertices':
+            break
+    for line in lines:
+        if line == 'end vertices':
+            break
+        id_, x, y = line.split()
+        ret[id_] = float(x), float(y)
+    return ret
+
+def write_word_graph(graph, out, engine='native', format='text'):
+    """
+    Write a wordgraph.word_graph in the format searchview expects, using its
+    stored layout if it has one.
+    """
+    positions = None
+    if graph.positions is not None:
+        positions = dict((w, graph.position(i))
+                         for i, w in enumerate(graph.words))
+    write_graph(graph.edges(), out, positions, engine, format)
+
 if __name__ == '__main__':
-    test_graph()
+    import sys
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    test_graph(*args[:1], 
+               engine='sfdp' if '--sfdp' in sys.argv else 'native',
+               format='wordgraph' if '--binary' in sys.argv else 'text')
 
 
 
@@ -1,9 +1,11 @@
 from __future__ import division
 
+from array import array
+from itertools import izip
+import math
 import random
-import time
 
-from la import convex_hull, vec2
+from la import vec2
 
 
 # Parameters.
@@ -11,6 +13,8 @@ world_width = 700
 world_height = 500
 min_dist = 4
 prob_link = .4 
+# Area per vertex in the output of verts, measured.
+area_per_vertex = 1.18 * min_dist * min_dist
 
 
 class vec2wid(vec2):
@@ -20,193 +24,226 @@ class vec2wid(vec2):
     def __repr__(self):
         return "<vec2 %s: %s, %s>" % (self.id, self.x, self.y)
 
-def verts():
+def verts(width=None, height=None, seed=None, tries=16):
+    """
+    Return vertices scattered at random over a `width` by `height` world
+    (by default, `world_width` by `world_height`), no two of them closer
+    than `min_dist`, and leaving little room for more.
+
+    This is Bridson's "Fast Poisson disk sampling in arbitrary dimensions":
+    a background grid of cells with side min_dist / sqrt(2) holds at most
+    one vertex each, so the vertices a candidate could be too close to are
+    found in the cells up to two away from it.  Starting from a random
+    vertex, a random active vertex is picked each time and candidates
+    around it are tried; the first one far enough from every other vertex
+    is added (and made active), and if none is, the vertex is retired.
+
+    As in Martin Roberts' variant of it, the candidates are `tries` points
+    evenly spaced, from a random angle, on the circle of radius min_dist
+    around the vertex, which packs the vertices tighter with fewer tries.
+
+    The same `seed` always gives the same vertices.
+    """
+    if width is None:
+        width = world_width
+    if height is None:
+        height = world_height
+    rng = random.Random(seed)
+    cell = min_dist / math.sqrt(2)
+    # The grid has a margin of two empty cells all around, so looking
+    # around a cell never goes off it.
+    columns = int(math.ceil(width / cell)) + 4
+    rows = int(math.ceil(height / cell)) + 4
+    # Index into `xs` and `ys` of the vertex in each cell, or -1.
+    grid = array('i', [-1]) * (columns * rows)
+    # Offsets to the cells that can hold a vertex closer than min_dist to
+    # one in a given cell, nearest first: the 5x5 cells around it, but the
+    # corners, which are at least min_dist away.
+    around = sorted(((dx, dy) 
+                     for dx in xrange(-2, 3) 
+                     for dy in xrange(-2, 3) 
+                     if abs(dx) + abs(dy) < 4),
+                    key=(lambda (dx, dy): dx * dx + dy * dy))
+    around = [dy * columns + dx for dx, dy in around]
+    xs = array('d')
+    ys = array('d')
+    active = []
+    # A little over min_dist, so rounding doesn't bring candidates closer.
+    radius = min_dist * (1 + 1e-9)
+    min_dist2 = min_dist * min_dist
+    directions = [(math.cos(2 * math.pi * j / tries), 
+                   math.sin(2 * math.pi * j / tries))
+                  for j in xrange(tries)]
+
+    def add(x, y, index):
+        i = len(xs)
+        xs.append(x)
+        ys.append(y)
+        grid[index] = i
+        active.append(i)
+
+    x = rng.random() * width
+    y = rng.random() * height
+    add(x, y, (int(y / cell) + 2) * columns + int(x / cell) + 2)
+    random_ = rng.random
+    while active:
+        k = int(random_() * len(active))
+        i = active[k]
+        x = xs[i]
+        y = ys[i]
+        # Rotate the directions by a random angle.
+        angle = 2 * math.pi * random_()
+        c = math.cos(angle)
+        s = math.sin(angle)
+        for dx, dy in directions:
+            cx = x + radius * (c * dx - s * dy)
+            cy = y + radius * (s * dx + c * dy)
+            if not (0 <= cx < width and 0 <= cy < height):
+                continue
+            index = (int(cy / cell) + 2) * columns + int(cx / cell) + 2
+            for offset in around:
+                other = grid[index + offset]
+                if other != -1:
+                    ox = xs[other] - cx
+                    oy = ys[other] - cy
+                    if ox * ox + oy * oy < min_dist2:
+                        break
+            else:
+                add(cx, cy, index)
+                break
+        else:
+            active[k] = active[-1]
+            active.pop()
+    return [vec2wid(x, y, i) for i, (x, y) in enumerate(izip(xs, ys))]
+
+def edges(vertices, rng=random):
+    """
+    Return a list of (vertex, vertex) edges joining `vertices`.
+
+    This algorithm tries to absolutely avoid crossing edges and islands,
+    and reduce the probability of extreme angles and lengths.
+
+    The vertices are split in two halves about the median of their x or y
+    coordinate, whichever they spread more along, and each half is split
+    again in the same way, down to single vertices.  Each time, the
+    vertices of either half that are within a strip around the split are
+    walked together in order of their other coordinate, and consecutive
+    pairs are linked with probability `prob_link` (or, if none are, the
+    middle ones of each strip are).  If one of the strips is empty, the
+    nearest vertices of each half are linked instead.  So edges never
+    cross a split they don't join, and both halves always end up joined.
+
+    Every vertex is kept as its index in two arrays, `by_x` and `by_y`,
+    sorted by either coordinate.  A half is a range of positions in both,
+    holding the same vertices; splitting it partitions the range of the
+    array that's not sorted along the split, keeping the order of each
+    side.  Halves waiting to be split are kept in a stack.  Time is
+    n*log(n).
+    """
+    n = len(vertices)
+    coords = [array('d', (v.x for v in vertices)),
+              array('d', (v.y for v in vertices))]
+    by_coord = [array('i', sorted(xrange(n), key=coords[axis].__getitem__))
+                for axis in [0, 1]]
+    # Whether each vertex is in the half with the lower coordinates, in
+    # the current split.
+    lower = array('b', [0]) * n
+    buffer = array('i', [0]) * n
+    strip_breadth = min_dist * 1.3
     ret = []
+    random_ = rng.random
+
+    stack = [(0, n)]
+    while stack:
+        begin, end = stack.pop()
+        if end - begin < 2:
+            continue
+        xs, ys = coords
+        by_x, by_y = by_coord
+        hdelta = xs[by_x[end-1]] - xs[by_x[begin]]
+        vdelta = ys[by_y[end-1]] - ys[by_y[begin]]
+
+        # If True, space is vertically elongated, split about horizontal
+        # axis, that is, according to y value.
+        vertical = int(hdelta < vdelta)
+        split = by_coord[vertical]
+        other = by_coord[not vertical]
+        split_coords = coords[vertical]
+        other_coords = coords[not vertical]
+
+        # Position of lowest element in top partition.
+        mid = (begin + end) // 2
+        mid_coord = split_coords[split[mid]]
+        for k in xrange(begin, mid):
+            lower[split[k]] = 1
+        for k in xrange(mid, end):
+            lower[split[k]] = 0
+
+        # Stable partition of the other array, picking the vertices in
+        # either strip along the way (in order of the other coordinate).
+        less_strip = []
+        more_strip = []
+        low = begin
+        high = mid
+        for k in xrange(begin, end):
+            v = other[k]
+            near = abs(split_coords[v] - mid_coord) < strip_breadth
+            if lower[v]:
+                buffer[low] = v
+                low += 1
+                if near:
+                    less_strip.append(v)
+            else:
+                buffer[high] = v
+                high += 1
+                if near:
+                    more_strip.append(v)
+        other[begin:end] = buffer[begin:end]
+
+        stack.append((mid, end))
+        stack.append((begin, mid))
+
+        # Add some edges to connect top to bottom.  If this doesn't give
+        # some candidate vertices at both sides, just sloppily connect the
+        # division vertex with the highest vertex in the low division.
+        # This last resource should avoid islands.
+        if not less_strip:
+            ret.append((vertices[split[mid]], vertices[split[mid-1]]))
+            continue
 
-    begin = time.time()
-    seen = 0
-    screen = set([(x, y) 
-                  for x in xrange(world_width) 
-                  for y in xrange(world_height)])
-    while screen:
-        x, y = random.choice(list(screen))
-        ret.append(vec2wid(x, y, len(ret)))
-        for nx in xrange(x-min_dist, x+min_dist):
-            for ny in xrange(y-min_dist, y+min_dist):
-                try:
-                    screen.remove((nx, ny))
-                except KeyError:
-                    pass
-        if (len(ret) % 100) == 0 and len(ret) > seen:
-            seen = len(ret)
-            now = time.time()
-            print now-begin, ": Got", len(ret), "ret."
-            begin = now
+        for a, b in link_strips(less_strip, more_strip, 
+                                other_coords.__getitem__, random_):
+            ret.append((vertices[a], vertices[b]))
     return ret
 
-def edges(vertices):
+def link_strips(less_strip, more_strip, key, random_=random.random):
+    """
+    Return some edges, as (less, more) pairs, between the items of two
+    non-empty lists sorted by `key`, that don't cross each other.
 
+    Both lists are walked together in order of `key`, and each pair of
+    items that are consecutive among both is linked with probability
+    `prob_link`.  If none are, the middle items of both lists are.
+    """
     ret = []
-    def add_edge(a, b):
-        ret.append((a, b))
-
-    def rec_edges(hsorted, vsorted, indentation=0):
-        """
-        Populate the `ret` array with a suitable list of edges.
-
-        This algorithm tries to absolutely avoid crossing edges and islands,
-        and reduce the probability of extreme angles and lengths.
-
-        Target time complexity is n*log(n).
-        """
-        def prindent(*args):
-            return
-            print ("    " * indentation) + " ".join(map(str, args))
-        assert len(hsorted) == len(vsorted)
-        if len(hsorted) < 2:
-            return
-        hdelta = hsorted[-1].x - hsorted[0].x
-        vdelta = vsorted[-1].y - vsorted[0].y
-
-        # If True, space is vertically elongated, split about horizontal axis,
-        # that is, according to y value.
-        vertical = int(hdelta < vdelta)
-
-        if vertical:
-            array, other_array = vsorted, hsorted
-
-        else:
-            array, other_array = hsorted, vsorted
-
-        # Index of lowest element in top partition.
-        mid_index = len(array)//2
-        mid_coord = array[mid_index][vertical]
-        less_sorted = array[:mid_index]
-        more_sorted = array[mid_index:]
-
-        if vertical:
-            prindent("Vertical split around %s." % array[mid_index].id)
-            prindent("below:", *(v.id for v in less_sorted))
-            prindent("above:", *(v.id for v in more_sorted))
-        else:
-            prindent("Horizontal split around %s." % array[mid_index].id)
-            prindent("left:", *(v.id for v in less_sorted))
-            prindent("right:", *(v.id for v in more_sorted))
-
-        # XXX: sleazy hack.  Not sure that this is correct, but if I get a
-        #      good-looking graph I'll happily sweep this under the rug.
-        #      To ensure correctness, I should do this as a preprocess instead.
-        epsilon = .0001
-        for v in reversed(less_sorted):
-            if v[vertical] == mid_coord:
-                v[vertical] -= epsilon
-            else:
+    i = j = 0
+    while True:
+        a = less_strip[i]
+        b = more_strip[j]
+        if random_() <= prob_link:
+            ret.append((a, b))
+        if i + 1 == len(less_strip):
+            if j + 1 == len(more_strip):
                 break
-
-        other_less_sorted = [v
-                             for v in other_array
-                             if v[vertical] < mid_coord]
-        other_more_sorted = [v
-                             for v in other_array
-                             if v[vertical] >= mid_coord]
-        if vertical:
-            rec_edges(other_less_sorted, less_sorted, indentation+1)
-            rec_edges(other_more_sorted, more_sorted, indentation+1)
+            j += 1
+        elif (j + 1 == len(more_strip)
+              or key(less_strip[i+1]) < key(more_strip[j+1])):
+            i += 1
         else:
-            rec_edges(less_sorted, other_less_sorted, indentation+1)
-            rec_edges(more_sorted, other_more_sorted, indentation+1)
-
-        # At this point I have hopefully done a decent job of connecting
-        # both divisions internally.  I'll add some edges to connect top
-        # to bottom.
-
-        # If possible, I'd rather connect only edges that are not too far
-        # from each other.  First I'll try to isolate a horizontal strip
-        # around the division point.
-        # I want this strip ordered in the 'other' direction.
-        strip_breadth = min_dist * 1.3
-        def filter_strip(division):
-            return [v
-                    for v in division
-                    if abs(v[vertical] - mid_coord) < strip_breadth]
-
-        less_strip = filter_strip(other_less_sorted)
-        more_strip = filter_strip(other_more_sorted)
-
-        # If this doesn't give me some candidate vertices at both sides,
-        # I'll default to just sloppily connect the division vertex with
-        # the highest vertex in the low division.  This last resource
-        # should avoid islands.
-        if not less_strip:
-            prindent("something crazy", more_sorted[0].id, less_sorted[-1].id)
-            add_edge(more_sorted[0], less_sorted[-1])
-            return
-
-        # In order to guarantee that I don't cross any edges internal to
-        # each subdivision, for each strip I'll discard all vertices but
-        # the ones in the 'front-facing' side of its convex hull.  A simple
-        # way to discard 'back-facing' vertices is to add two additional
-        # vertices that are guaranteed to form the whole backside, then
-        # remove those.
-
-        def frontside(strip, direction):
-            behind = mid_coord - direction * strip_breadth * 2
-            backyard_eaters = [vec2(0, 0), vec2(0, 0)]
-            backyard_eaters[0][vertical] = behind
-            backyard_eaters[0][not vertical] = strip[0][not vertical]
-            backyard_eaters[1][vertical] = behind
-            backyard_eaters[1][not vertical] = strip[-1][not vertical]
-            ret = convex_hull(strip + backyard_eaters)
-            for bogus in backyard_eaters:
-                try:
-                    ret.remove(bogus)
-                except ValueError:
-                    # Special case: we had only one vertex, or several aligned
-                    # vertices.
-                    assert len(ret) == 1
-            # convex_hull() messes with the ordering of our lists!
-            # I need to re-sort here :/
-            ret.sort(key=(lambda v: v[not vertical]))
-            return ret
-        
-        #less_strip = frontside(less_strip, +1)
-        #more_strip = frontside(more_strip, -1)
-        
-        def merge(a_strip, b_strip):
-            a = a_strip.pop(0)
-            b = b_strip.pop(0)
-            while True:
-                yield a, b
-                if not a_strip:
-                    for b in b_strip:
-                        yield a, b
-                    return
-                if not b_strip:
-                    for a in a_strip:
-                        yield a, b
-                    return
-                if a_strip[0][not vertical] < b_strip[0][not vertical]:
-                    a = a_strip.pop(0)
-                else:
-                    b = b_strip.pop(0)
-
-        linked_any = False
-        # I get this now because merge destroys the strips.
-        default_edge = (less_strip[len(less_strip)//2], 
-                        more_strip[len(more_strip)//2])
-        for less, more in merge(less_strip, more_strip):
-            prindent("considering", less.id, more.id)
-            if random.random() <= prob_link:
-                prindent("adding edge", less.id, more.id)
-                add_edge(less, more)
-                linked_any = True
-        if not linked_any:
-            prindent("default edge", default_edge[0].id, default_edge[1].id)
-            add_edge(*default_edge)
-        prindent("end split")
-
-    rec_edges(sorted(vertices, key=(lambda v: v.x)), 
-              sorted(vertices, key=(lambda v: v.y)))
+            j += 1
+    if not ret:
+        ret.append((less_strip[len(less_strip)//2], 
+                    more_strip[len(more_strip)//2]))
     return ret
 
 def write_verts_and_edges(v=None, e=None):
@@ -256,5 +293,14 @@ def load_graph(filename):
 
 
 if __name__ == '__main__':
-    write_verts_and_edges()
+    import sys
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], True)
+                   for arg in sys.argv[1:]
+                   if arg.startswith('--'))
+    seed = options.get('seed')
+    if seed is not None:
+        random.seed(int(seed))
+    write_verts_and_edges(verts(int(options.get('width', world_width)),
+                                int(options.get('height', world_height)),
+                                seed and int(seed)))
     #debug_edges()
@@ -1,12 +1,15 @@
 from __future__ import division
 
-from collections import defaultdict
+from array import array
 import gc
 from heapq import heappush, heappop
 from itertools import *
+ichain = chain.from_iterable
+from math import hypot
 import sys
 import time
 
+import instrument
 import prettygraph
 
 
@@ -15,26 +18,81 @@ visited_color = 'dark_red'
 frontier_color = 'red'
 
 class problem_2d:
+    """
+    Shortest path between two vertices of a graph embedded in the plane.
+
+    The graph is kept in compressed sparse row form: the neighbors of the
+    vertex with index `i` are `targets[offsets[i]:offsets[i+1]]`, and the
+    lengths of the edges leading to them are the same slice of `weights`.
+    Edge lengths, and distances to the goal, are computed only once, so
+    expanding a node involves no geometry.
+    """
     def __init__(self, vertices, edges, start, goal):
-        vert_dict = {v.id: v
-                     for v in vertices}
-        self.connections = defaultdict(list)
-        for e1, e2 in edges:
-            self.connections[e1].append(vert_dict[e2])
-            self.connections[e2].append(vert_dict[e1])
-        self.start = vert_dict[start]
-        self.goal = vert_dict[goal]
+        self.vertices = list(vertices)
+        self.index_by_id = {v.id: i
+                            for i, v in enumerate(self.vertices)}
+        index = self.index_by_id
+        xs = self.xs = array('d', (v.x for v in self.vertices))
+        ys = self.ys = array('d', (v.y for v in self.vertices))
+        # Counting sort of both directions of every edge by source vertex.
+        # The neighbors of each vertex stay in the order of `edges`.  All
+        # buffers are arrays from the start, so we never hold a list of
+        # boxed numbers per edge.
+        ends = array('i', (index[id_] for id_ in ichain(edges)))
+        offsets = self.offsets = array('l', [0]) * (len(self.vertices) + 1)
+        for i in ends:
+            offsets[i+1] += 1
+        total = 0
+        for i, degree in enumerate(offsets):
+            total += degree
+            offsets[i] = total
+        cursor = array('l', offsets)
+        targets = self.targets = array('i', [0]) * len(ends)
+        weights = self.weights = array('d', [0.]) * len(ends)
+        pairs = iter(ends)
+        for a, b in izip(pairs, pairs):
+            weight = hypot(xs[b] - xs[a], ys[b] - ys[a])
+            k = cursor[a]
+            targets[k] = b
+            weights[k] = weight
+            cursor[a] = k + 1
+            k = cursor[b]
+            targets[k] = a
+            weights[k] = weight
+            cursor[b] = k + 1
+        del ends, cursor
+        self.start = self.vertices[index[start]]
+        self.goal = self.vertices[index[goal]]
+        self.distances = {}
+    def distances_to(self, target):
+        """
+        Return an array with the straight line distance of every vertex to
+        `target`.
+        """
+        try:
+            return self.distances[target.id]
+        except KeyError:
+            ret = self.distances[target.id] = array(
+                    'd', map(hypot,
+                             [x - target.x for x in self.xs],
+                             [y - target.y for y in self.ys]))
+            return ret
     def start_node(self):
         return node(self.start, None, 0, (self.start - self.goal).length())
     def goal_node(self):
         return node(self.goal, None, 0, (self.start - self.goal).length())
     def expand(self, n, goal=None):
-        goal = goal or self.goal
-        for v in self.connections[n.state.id]:
-            yield node(v, 
+        heuristic = self.distances_to(goal or self.goal)
+        vertices = self.vertices
+        targets = self.targets
+        weights = self.weights
+        i = self.index_by_id[n.state.id]
+        for k in xrange(self.offsets[i], self.offsets[i+1]):
+            j = targets[k]
+            yield node(vertices[j], 
                        n, 
-                       n.cost + (v - n.state).length(), 
-                       (v - goal).length())
+                       n.cost + weights[k], 
+                       heuristic[j])
     def is_goal(self, state):
         return state.id == self.goal.id
     def heuristic_cost(self, node):
@@ -56,7 +114,10 @@ def solution(node):
     return ret
 
 def graph_search(add_to_frontier, choose_from_frontier):
-    def search(problem, log):
+    def search(problem, log, stats=None):
+        if stats is not None:
+            problem = stats.wrap_problem(problem)
+            log = stats.wrap_log(log)
         visited = set()
         frontier = []
         add_to_frontier(frontier, problem.start_node())
@@ -65,6 +126,8 @@ def graph_search(add_to_frontier, choose_from_frontier):
             while frontier:
                 log('step', time.time() - start_time)
                 node = choose_from_frontier(frontier)
+                if stats is not None:
+                    stats.pop()
                 if problem.is_goal(node.state):
                     ret = solution(node)
                     log_solution(ret, log)
@@ -89,6 +152,12 @@ def graph_search(add_to_frontier, choose_from_frontier):
                                 neighbor.state.id,
                                 frontier_color)
                             add_to_frontier(frontier, neighbor)
+                            if stats is not None:
+                                stats.push(neighbor.state.id, len(frontier))
+                        elif stats is not None:
+                            stats.visited_hit()
+                elif stats is not None:
+                    stats.visited_hit()
         finally:
             log('step', time.time() - start_time)
             print "Visited", len(visited), "nodes."
@@ -115,6 +184,14 @@ def astar_push(frontier, node):
     heappush(frontier, (node.cost + node.heuristic_estimate, node))
 astar_search = graph_search(astar_push, pop_by_priority)
 
+# These need NumPy, so we only import it if they're actually used.
+def vectorized_uniform_cost_search(problem, log, stats=None):
+    import vectorsearch
+    return vectorsearch.uniform_cost_search(problem, log, stats)
+def vectorized_astar_search(problem, log, stats=None):
+    import vectorsearch
+    return vectorsearch.astar_search(problem, log, stats)
+
 class search_state:
     def __init__(self, start, goal, color):
         self.frontier = [(0, start)]
@@ -122,7 +199,10 @@ class search_state:
         self.frontier_color = color
         self.visited_color = 'dark_' + color
 
-def bidirectional_astar_search(problem, log):
+def bidirectional_astar_search(problem, log, stats=None):
+    if stats is not None:
+        problem = stats.wrap_problem(problem)
+        log = stats.wrap_log(log)
     start = problem.start_node()
     goal = problem.goal_node()
     searches = [search_state(start, goal, 'red'),
@@ -135,6 +215,8 @@ def bidirectional_astar_search(problem, log):
         for search, other in searches, reversed(searches):
             log('step', time.time() - start_time)
             estimate, node = heappop(search.frontier)
+            if stats is not None:
+                stats.pop()
             log('vertex_color', node.state.id, search.visited_color)
             if node.parent:
                 log('edge_color', 
@@ -142,6 +224,8 @@ def bidirectional_astar_search(problem, log):
                     node.state.id,
                     search.visited_color)
             if node.state.id in visited or estimate > best_path_cost:
+                if stats is not None and node.state.id in visited:
+                    stats.visited_hit()
                 continue
             visited.add(node.state.id)
             for blah, other_node in other.frontier:
@@ -167,6 +251,12 @@ def bidirectional_astar_search(problem, log):
                             search.frontier_color)
                         heappush(search.frontier, 
                                  (estimate, child))
+                        if stats is not None:
+                            stats.push((search.frontier_color, 
+                                        child.state.id),
+                                       len(search.frontier))
+                    elif stats is not None and child.state.id in visited:
+                        stats.visited_hit()
     log('step', time.time() - start_time)
     if best_path is None:
         return None
@@ -182,7 +272,16 @@ def bidirectional_astar_search(problem, log):
         print "visited", len(visited), "nodes."
         return ret
 
-def log_search(search, graph_filename, start, goal, log_filename):
+def log_search(search, graph_filename, start, goal, log_filename, 
+               stats=None, profile_filename=None, sample_filename=None):
+    """
+    Run a search and write its history to `log_filename`.
+
+    If `stats` is given, it's passed on to the search (see instrument.py).
+    If `profile_filename` is given, the search runs under cProfile and the
+    profile is dumped there.  If `sample_filename` is given, the search is
+    sampled by instrument.sampler and the stacks are written there.
+    """
     gc.disable()
     vertices, edges = prettygraph.load_graph(graph_filename)
     problem = problem_2d(vertices, edges, start, goal)
@@ -191,14 +290,36 @@ def log_search(search, graph_filename, start, goal, log_filename):
             log_file.write(' '.join(map(str, args))+'\n')
         log('start', start)
         log('goal', goal)
-        globals()[search+'_search'](problem, log)
+        fn = globals()[search+'_search']
+        if profile_filename:
+            ret, profile = instrument.profiled(fn, problem, log, stats)
+            profile.dump_stats(profile_filename)
+        elif sample_filename:
+            with instrument.sampler() as sampler:
+                ret = fn(problem, log, stats)
+            sampler.write_collapsed(file(sample_filename, 'w'))
+        else:
+            ret = fn(problem, log, stats)
+    if stats is not None:
+        for name, value in sorted(stats.summary().items()):
+            print "%s: %s" % (name, value)
+    return ret
 
 if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], True)
+                   for arg in sys.argv[1:] 
+                   if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
     try:
-        search, graph_filename, start, end, log_filename = sys.argv[1:]
+        search, graph_filename, start, end, log_filename = args
     except ValueError:
-        print ("Usage: %s <search_algorithm> <graph_filename> "
+        print ("Usage: %s [--stats] [--step-stats] [--profile=<filename>] "
+               "[--sample=<filename>] <search_algorithm> <graph_filename> "
                "<start> <end> <log_filename>"
                % sys.argv[0])
         sys.exit(1)
-    log_search(search, graph_filename, start, end, log_filename)
+    stats = None
+    if 'stats' in options or 'step-stats' in options:
+        stats = instrument.search_stats(per_step='step-stats' in options)
+    log_search(search, graph_filename, start, end, log_filename, 
+               stats, options.get('profile'), options.get('sample'))
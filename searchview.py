@@ -74,93 +74,10 @@ from pyglet.window import key, mouse
 from pyglet.gl import *
 import yaml
 
-from util import obj
 import ui
 from la import vec2
-
-colors = {'white': (1., 1., 1.),
-          'grey': (.5, .5, .5),
-          'red': (1., .0, .0),
-          'green': (.0, 1., .0),
-          'blue': (.0, .0, 1.),
-          'cyan': (.0, 1., 1.),
-          'magenta': (1., .0, 1.),
-          'yellow': (1., 1., .0),
-          'teal': (.4, .8, .6)}
-def to255range(f):
-    return int(round(f * 255))
-for k, (r, g, b) in colors.items():
-    colors[k] = tuple(map(to255range, [r, g, b]))
-    if k != "white":
-        colors["dark_"+k] = tuple(map(to255range, [r/2, g/2, b/2]))
-colors['default'] = colors['grey']
-
-class bsp_tree:
-
-    max_verts_per_cell = 10
-
-    class node:
-        def __init__(self, direction, center, less, more):
-            """
-            `direction` == 0 for nodes split by a vertical line (i.e. according
-            to x).
-            `direction` == 1 for nodes split by a horizontal line (i.e.
-            according to y).
-            `center` is x coordinate if direction == 0, else y coordinate.
-            `less` and `more` are nodes representing the points at either side
-            of my `center`.
-            """
-            self.direction = direction
-            self.center = center
-            self.less = less
-            self.more = more
-        def query(self, *args):
-            return (self.less
-                    if args[self.direction] < self.center
-                    else self.more).query(*args)
-
-    class leaf:
-        def __init__(self, vertices):
-            self.vertices = vertices
-        def query(self, x, y):
-            return self.vertices
-            
-    def __init__(self, vertices):
-        self.root = self.build(vertices)
-
-    def query(self, x, y):
-        return self.root.query(x, y)
-
-    @staticmethod
-    def extents(vertices):
-        min_ = vec2(*vertices[0][1:])
-        max_ = vec2(*vertices[0][1:])
-        for id_, x, y in vertices:
-            if x < min_.x:
-                min_.x = x
-            if x > max_.x:
-                max_.x = x
-            if y < min_.y:
-                min_.y = y
-            if y > max_.y:
-                max_.y = y
-        size = max_ - min_
-        return ui.rect(min_.x, min_.y, size.x, size.y)
-
-    def build(self, vertices):
-        if len(vertices) <= self.max_verts_per_cell:
-            return self.leaf(vertices)
-        else:
-            rect = self.extents(vertices)
-            index = int(rect.width < rect.height)
-            less = []
-            more = []
-            center = rect.center[index]
-            for v in vertices:
-                coord = v[index + 1]  # v is (id_, x, y)
-                (less if coord < center else more).append(v)
-            assert less and more
-            return self.node(index, center, self.build(less), self.build(more))
+from searchdata import (bsp_tree, colors, copy_buffer, graph_lines, parse,
+                        position_at_time)
 
 class view(ui.window):
 
@@ -168,8 +85,8 @@ class view(ui.window):
         graph = kw.pop('graph')
         history = kw.pop('history')
         ui.window.__init__(self, **kw)
-        vertices, edges, start, goal, color_history = parse(file(graph),
-                                                            file(history))
+        vertices, edges, start, goal, color_history = parse(
+                graph_lines(graph), file(history))
         self.vertices = vertices
         self.start = start
         self.goal = goal
@@ -385,14 +302,7 @@ class view(ui.window):
             copy_buffer(self.edge_buffer.colors, current.edge_colors)
 
     def go_to_time(self, t):
-        start, end = 0, len(self.history) - 1
-        while start < end:
-            middle = (start + end) // 2
-            if self.history[middle].time < t:
-                start = middle + 1
-            else:
-                end = middle
-        self.go_to_position(start)
+        self.go_to_position(position_at_time(self.history, t))
 
     def draw(self):
         if not hasattr(self, 'absolute_rect'):
@@ -613,130 +523,6 @@ class slider_handle(ui.window):
         glVertex2i(0, self.rect.height)
         glEnd()
 
-def parse(graph_lines, history_lines):
-    """
-    Parse commands and return a tuple with the following elements:
-        vertices
-            A ctypes array of vertices in v2f format.
-        edges
-            A ctypes array of vertices in v2f format, ready to pass to
-            GL_LINES.
-        start
-            The vertex corresponding to the starting position, as an index
-            into the vertices array.
-        goal
-            The vertex corresponting to the ending position, as an index
-            into the vertices array.
-        color_history
-            A list of `obj`s where each of them has the attributes:
-                time
-                    Time in seconds from start of search.
-                vertex_colors
-                    A ctypes array of colors in c3B format, corresponding to
-                    the vertices.
-                edge_colors
-                    A ctypes array of colors in c3B format, corresponding to
-                    the edges.
-    """
-    # This function makes heavy use of iterators and itertools.
-    #
-    # http://docs.python.org/library/itertools.html
-    vertices = None
-    edges = None
-    start = None
-    goal = None
-    color_history = [obj(time=0.0)]
-
-    it = ifilter(None, imap(str.strip, graph_lines))
-
-    def take_tuples_until(s):
-        return imap(str.split,
-                    takewhile((lambda l: l != s), it))
-
-    # Vertices.
-    assert it.next() == 'begin vertices'
-    vertices = {id_: (float(x), float(y))
-                for id_, x, y in take_tuples_until('end vertices')}
-    vert_list = [(id_, x, y) for id_, (x, y) in vertices.iteritems()]
-    vertex_index_by_id = {id_: i for i, (id_, x, y) in enumerate(vert_list)}
-    vertex_buffer = (c_float * (len(vert_list) * 2))(
-            *ichain((x, y) for (id_, x, y) in vert_list))
-
-    v = obj(coords_by_id=vertices,
-            flat_list=vert_list,
-            index_by_id=vertex_index_by_id,
-            buffer=vertex_buffer)
-    len_vert_colors = len(vert_list) * 3
-    color_history[0].vertex_colors = (c_ubyte * len_vert_colors)(
-        *repeat(colors['default'][0], len_vert_colors))
-
-    # Edges.
-    assert it.next() == 'begin edges'
-    edges = [frozenset((a, b))
-             for a, b in take_tuples_until('end edges')]
-    edge_index_by_vertex_ids = {pair:i
-                                for i, pair in enumerate(edges)}
-
-    edge_buffer = (c_float * (len(edges) * 4))(
-                   *ichain(ichain((vertices[a], 
-                                   vertices[b])
-                                   for a, b in edges)))
-    len_edge_colors = len(edges) * 6
-    color_history[0].edge_colors = (c_ubyte * len_edge_colors)(
-            *repeat(colors['default'][0], len_edge_colors))
-
-    for rest in it:
-        if rest.strip():
-            print "Got unexpected line", repr(rest)
-
-    for line in history_lines:
-        line = line.strip()
-        if not line:
-            continue
-        cmd, rest = line.split(None, 1)
-        args = rest.split()
-        if cmd == 'start':
-            assert len(args) == 1
-            start = vertices[args[0]]
-        elif cmd == 'goal':
-            assert len(args) == 1
-            goal = vertices[args[0]]
-        elif cmd == 'step':
-            assert len(args) == 1
-            timestamp = float(args[0])
-            color_history.append(
-                obj(time=timestamp,
-                    vertex_colors=clone_array(color_history[-1].vertex_colors),
-                    edge_colors=clone_array(color_history[-1].edge_colors)))
-        elif cmd == 'vertex_color':
-            id_, color_name = args
-            index = vertex_index_by_id[id_]
-            color_history[-1].vertex_colors[index*3:index*3+3] = \
-                    colors[color_name]
-        elif cmd == 'edge_color':
-            a, b, color_name = args
-            index = edge_index_by_vertex_ids[frozenset((a, b))]
-            color_history[-1].edge_colors[index*6:index*6+6] = \
-                    colors[color_name] * 2
-        else:
-            raise RuntimeError("Unknown command:", cmd)
-
-    assert None not in [vertex_buffer, edge_buffer, start, goal]
-    return v, edge_buffer, start, goal, color_history
-
-def even(x):
-    return not (x & 1)
-
-def clone_array(a):
-    # XXX: assuming c_ubyte array.  Learn how to figure out actual type.
-    ret = (c_ubyte * len(a))()
-    copy_buffer(ret, a)
-    assert len(ret) == len(a)
-    return ret
-
-def copy_buffer(dst, src):
-    memmove(dst, src, sizeof(dst))
-
 def run(filename):
     w = pyglet.window.Window(fullscreen=True)
     ui.init(w)
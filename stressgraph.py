@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+"""
+Generate big graphs, and histories of searches on them, to see how
+searchview and the searches cope at scale.
+
+    python stressgraph.py <graph> <history> [--vertices=<n>]
+                          [--steps=<n>] [--events-per-step=<n>]
+                          [--tile=<n>] [--seed=<n>] [--binary]
+
+The graph looks like prettygraph's, just bigger: the world is a grid of
+square tiles, each with about `--tile` vertices laid out and linked by
+prettygraph, and neighboring tiles are linked along their common side the
+same way prettygraph links the halves of a split.  Tiles are generated one
+at a time, so memory use depends on the tile size, not on the number of
+vertices.
+
+Vertex ids are numbers, zero padded to the same width, so they sort the
+same way as text and as numbers.  The graph is written in the text format
+searchview reads, or, with --binary, as a wordgraph.py file with a layout
+(which searchview reads too).  Either way, edges are kept on disk until
+the vertices are written.
+
+The history has `--steps` steps, 1/60 of a second apart, each with
+`--events-per-step` random vertex_color or edge_color commands.  Edges are
+picked from a fixed size random sample of the graph's.
+
+Everything is reproducible with the same `--seed`.
+"""
+
+from __future__ import division
+
+import argparse
+from array import array
+import math
+import random
+import shutil
+import struct
+import tempfile
+
+import makegraph
+import prettygraph
+from prettygraph import area_per_vertex, min_dist
+from searchdata import colors
+import wordgraph
+
+
+fps = 60
+# Vertices are linked to those in neighboring tiles if they are within
+# this distance of their common side.
+join_breadth = min_dist * 3
+# Edges kept for the history to pick from.
+edge_sample_size = 1 << 16
+
+def tiles(vertices, tile_vertices, seed):
+    """
+    Generate the graph tile by tile, yielding for each the id of its first
+    vertex, arrays with the x and y coordinates of its vertices, and the
+    edges that join them to each other and to the tiles yielded before, as
+    a list of (id, id) pairs.
+
+    The first value yielded is, instead, an upper bound on the number of
+    vertices, so ids can be formatted before the graph is done.
+    """
+    side = math.sqrt(vertices * area_per_vertex)
+    per_row = max(1, int(round(side / math.sqrt(tile_vertices
+                                                * area_per_vertex))))
+    tile_side = side / per_row
+    # prettygraph.verts puts at most one vertex in each cell of its grid.
+    cell = min_dist / math.sqrt(2)
+    yield per_row * per_row * int(math.ceil(tile_side / cell)) ** 2
+
+    # Each tile's vertices stay min_dist away from the next tiles, so they
+    # are at least min_dist away from every vertex in them too.
+    size = tile_side - min_dist
+    first = 0
+    # The vertices of the tiles in the row below, by column, that are near
+    # their top side, and those of the tile on the left that are near its
+    # right side, as (id, x, y) triples.
+    below = [None] * per_row
+    for row in xrange(per_row):
+        left = None
+        for column in xrange(per_row):
+            rng = random.Random(hash((seed, row, column)))
+            tile = prettygraph.verts(size, size, rng.getrandbits(32))
+            x0 = column * tile_side
+            y0 = row * tile_side
+            xs = array('d', (v.x + x0 for v in tile))
+            ys = array('d', (v.y + y0 for v in tile))
+            edges = [(first + a.id, first + b.id)
+                     for a, b in prettygraph.edges(tile, rng)]
+
+            def near(coords, value):
+                "Vertices with `coords` near `value`, or the nearest one."
+                ret = [(first + i, xs[i], ys[i])
+                       for i, c in enumerate(coords)
+                       if abs(c - value) < join_breadth]
+                if not ret:
+                    i = min(xrange(len(coords)),
+                            key=(lambda i: abs(coords[i] - value)))
+                    ret = [(first + i, xs[i], ys[i])]
+                return ret
+
+            if left is not None:
+                edges.extend((a, b) for (a, ax, ay), (b, bx, by)
+                             in prettygraph.link_strips(
+                                 left, sorted(near(xs, x0), key=by_y),
+                                 by_y, rng.random))
+            if below[column] is not None:
+                edges.extend((a, b) for (a, ax, ay), (b, bx, by)
+                             in prettygraph.link_strips(
+                                 below[column],
+                                 sorted(near(ys, y0), key=by_x),
+                                 by_x, rng.random))
+            left = sorted(near(xs, x0 + size), key=by_y)
+            below[column] = sorted(near(ys, y0 + size), key=by_x)
+            yield first, xs, ys, edges
+            first += len(xs)
+
+def by_x((id_, x, y)):
+    return x
+
+def by_y((id_, x, y)):
+    return y
+
+def write_graph(out, vertices, tile_vertices, seed, binary=False):
+    """
+    Write a graph to `out`, in text or wordgraph format.  Return the
+    number of vertices, the format of their ids, and a random sample of
+    (up to `edge_sample_size`) edges.
+    """
+    rng = random.Random(seed)
+    generate = tiles(vertices, tile_vertices, seed)
+    id_format = '%%0%dd' % len(str(generate.next()))
+    sample = []
+    seen = 0
+    # Text edge lines, or for the binary format, the words, positions and
+    # every edge in either direction as `i << 32 | j`.
+    edge_lines = tempfile.TemporaryFile()
+    words = tempfile.TemporaryFile()
+    positions = tempfile.TemporaryFile()
+    keys = makegraph.sorted_keys()
+    n = 0
+    if not binary:
+        out.write("begin vertices\n")
+    for first, xs, ys, edges in generate:
+        for edge in edges:
+            # Reservoir sampling.
+            seen += 1
+            if len(sample) < edge_sample_size:
+                sample.append(edge)
+            else:
+                k = rng.randrange(seen)
+                if k < edge_sample_size:
+                    sample[k] = edge
+        if binary:
+            if first:
+                words.write('\n')
+            words.write('\n'.join(id_format % i
+                                  for i in xrange(first, first + len(xs))))
+            coords = array('d', [0.]) * (2 * len(xs))
+            coords[0::2] = xs
+            coords[1::2] = ys
+            wordgraph.write_array(positions, coords)
+            keys.extend(a << 32 | b for a, b in edges)
+            keys.extend(b << 32 | a for a, b in edges)
+        else:
+            makegraph.write_lines(out, ((id_format + " %r %r") % vertex
+                                        for vertex in zip(xrange(first,
+                                                                 first
+                                                                 + len(xs)),
+                                                          xs, ys)))
+            makegraph.write_lines(edge_lines,
+                                  ((id_format + " " + id_format) % edge
+                                   for edge in edges))
+        n = first + len(xs)
+    if binary:
+        write_word_graph(out, n, words, keys, positions)
+    else:
+        out.write("end vertices\n\nbegin edges\n")
+        edge_lines.seek(0)
+        shutil.copyfileobj(edge_lines, out)
+        out.write("end edges\n")
+    return n, id_format, sample
+
+def write_word_graph(out, n, words, keys, positions):
+    """
+    Write a wordgraph.py file from temporary files with the words and
+    positions, and a makegraph.sorted_keys with the edges in both
+    directions.
+    """
+    offsets = wordgraph.int_array([0]) * (n + 1)
+    targets = tempfile.TemporaryFile()
+    mask = (1 << 32) - 1
+    block = wordgraph.int_array()
+    num_targets = 0
+    for key in keys:
+        offsets[(key >> 32) + 1] += 1
+        block.append(key & mask)
+        if len(block) >= makegraph.block_lines:
+            wordgraph.write_array(targets, block)
+            num_targets += len(block)
+            block = wordgraph.int_array()
+    wordgraph.write_array(targets, block)
+    num_targets += len(block)
+    for i in xrange(n):
+        offsets[i+1] += offsets[i]
+    out.write(wordgraph.magic)
+    out.write(wordgraph.header.pack(n, num_targets, wordgraph.has_layout))
+    out.write(struct.pack('<I', words.tell()))
+    for f in words, None, targets, positions:
+        if f is None:
+            wordgraph.write_array(out, offsets)
+        else:
+            f.seek(0)
+            shutil.copyfileobj(f, out)
+
+def write_history(out, n, id_format, edges, steps, events_per_step, seed):
+    "Write a history of random colorings of the graph write_graph wrote."
+    rng = random.Random(seed)
+    color_names = sorted(k for k in colors if k != 'default')
+    vertex_format = "vertex_color %s %%s" % id_format
+    edge_format = "edge_color %s %s %%s" % (id_format, id_format)
+
+    def lines():
+        yield "start %s" % id_format % rng.randrange(n)
+        yield "goal %s" % id_format % rng.randrange(n)
+        for step in xrange(steps):
+            yield "step %r" % (step / fps)
+            for i in xrange(events_per_step):
+                if rng.random() < .5:
+                    yield vertex_format % (rng.randrange(n),
+                                           rng.choice(color_names))
+                else:
+                    yield edge_format % (rng.choice(edges)
+                                         + (rng.choice(color_names),))
+    makegraph.write_lines(out, lines())
+
+def write_synthetic(graph_out, history_out, vertices, steps,
+                    events_per_step, seed, tile_vertices=1 << 14,
+                    binary=False):
+    "Write a graph to `graph_out`, and a history for it to `history_out`."
+    n, id_format, edges = write_graph(graph_out, vertices, tile_vertices,
+                                      seed, binary)
+    write_history(history_out, n, id_format, edges, steps, events_per_step,
+                  seed)
+
+def main():
+    parser = argparse.ArgumentParser(
+            description="Generate a big graph and a history for it.")
+    parser.add_argument('graph')
+    parser.add_argument('history')
+    parser.add_argument('--vertices', type=int, default=10000)
+    parser.add_argument('--steps', type=int, default=10000)
+    parser.add_argument('--events-per-step', type=int, default=100)
+    parser.add_argument('--tile', type=int, default=1 << 14,
+                        help="about how many vertices each tile has")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--binary', action='store_true',
+                        help="write the graph in wordgraph.py format")
+    options = parser.parse_args()
+    with file(options.graph, 'wb' if options.binary else 'w') as graph:
+        with file(options.history, 'w') as history:
+            write_synthetic(graph, history, options.vertices, options.steps,
+                            options.events_per_step, options.seed,
+                            options.tile, options.binary)
+
+if __name__ == '__main__':
+    main()
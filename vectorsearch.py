@@ -0,0 +1,144 @@
+"""
+Uniform cost and A* searches over the CSR arrays of a search.problem_2d, with
+NumPy relaxation of high degree vertices.
+
+Where search.graph_search creates a node object per neighbor and pushes all
+of them to the frontier, these searches keep tentative costs, parents and the
+set of settled vertices in flat arrays.  When a vertex is expanded, the
+tentative costs of all its neighbors are computed at once, settled vertices
+and non-improvements are masked out, and only the neighbors whose cost
+improved are pushed to the heap.
+
+Vectorizing only pays off when there are enough neighbors to amortize the
+NumPy call overhead, so vertices with fewer than `vectorize_degree` neighbors
+are relaxed with a plain loop over the same arrays.  Both paths work on the
+same memory: the NumPy arrays are views of the `array.array`s.
+
+Searches take the same arguments, print the same summary and log the same
+kind of history as the ones in search.py.
+"""
+
+from __future__ import division
+
+from array import array
+from heapq import heappush, heappop
+import time
+
+import numpy
+
+from search import frontier_color, log_solution, visited_color
+
+
+vectorize_degree = 16
+
+def view(a):
+    "Return a NumPy array sharing memory with the `array.array` `a`."
+    return numpy.frombuffer(a, dtype=numpy.dtype(a.typecode))
+
+def relaxing_search(use_heuristic):
+    def search(problem, log, stats=None):
+        if stats is not None:
+            log = stats.wrap_log(log)
+        n = len(problem.vertices)
+        ids = [v.id for v in problem.vertices]
+        offsets = problem.offsets
+        targets = problem.targets
+        weights = problem.weights
+        np_targets = view(targets)
+        np_weights = view(weights)
+        if use_heuristic:
+            heuristic = problem.distances_to(problem.goal)
+        else:
+            heuristic = array('d', [0.]) * n
+        np_heuristic = view(heuristic)
+        cost = array('d', [float('inf')]) * n
+        np_cost = view(cost)
+        settled = array('b', [0]) * n
+        np_settled = view(settled).view(numpy.bool_)
+        parent = array('l', [-1]) * n
+        np_parent = view(parent)
+
+        start = problem.index_by_id[problem.start.id]
+        goal = problem.index_by_id[problem.goal.id]
+        cost[start] = 0.
+        frontier = [(heuristic[start], start)]
+        visited = 0
+        start_time = time.time()
+        try:
+            while frontier:
+                log('step', time.time() - start_time)
+                estimate, i = heappop(frontier)
+                if stats is not None:
+                    stats.pop()
+                if settled[i]:
+                    # Stale entry; this vertex was reached more cheaply.
+                    if stats is not None:
+                        stats.visited_hit()
+                    continue
+                if i == goal:
+                    ret = []
+                    while i != -1:
+                        ret.append(ids[i])
+                        i = parent[i]
+                    ret.reverse()
+                    log_solution(ret, log)
+                    print "total cost is", cost[goal]
+                    print "length is", len(ret)
+                    return ret
+                settled[i] = 1
+                visited += 1
+                log('vertex_color', ids[i], visited_color)
+                if parent[i] != -1:
+                    log('edge_color', ids[parent[i]], ids[i], visited_color)
+                lo = offsets[i]
+                hi = offsets[i+1]
+                if stats is not None:
+                    stats.expansions += 1
+                    stats.generated += hi - lo
+                    expand_begin = time.time()
+                base = cost[i]
+                if hi - lo < vectorize_degree:
+                    improved = []
+                    for k in xrange(lo, hi):
+                        j = targets[k]
+                        if settled[j]:
+                            if stats is not None:
+                                stats.visited_hit()
+                            continue
+                        c = base + weights[k]
+                        if c < cost[j]:
+                            cost[j] = c
+                            parent[j] = i
+                            improved.append((c + heuristic[j], j))
+                else:
+                    neighbors = np_targets[lo:hi]
+                    tentative = base + np_weights[lo:hi]
+                    open_ = ~np_settled[neighbors]
+                    if stats is not None:
+                        stats.visited_hits += int(len(open_) - open_.sum())
+                    better = open_ & (tentative < np_cost[neighbors])
+                    neighbors = neighbors[better]
+                    tentative = tentative[better]
+                    # The same neighbor may appear more than once.
+                    numpy.minimum.at(np_cost, neighbors, tentative)
+                    best = tentative == np_cost[neighbors]
+                    neighbors = neighbors[best]
+                    np_parent[neighbors] = i
+                    improved = zip((np_cost[neighbors]
+                                    + np_heuristic[neighbors]).tolist(),
+                                   neighbors.tolist())
+                if stats is not None:
+                    stats.expand_time += time.time() - expand_begin
+                for estimate, j in improved:
+                    log('vertex_color', ids[j], frontier_color)
+                    log('edge_color', ids[i], ids[j], frontier_color)
+                    heappush(frontier, (estimate, j))
+                    if stats is not None:
+                        stats.push(j, len(frontier))
+        finally:
+            log('step', time.time() - start_time)
+            print "Visited", visited, "nodes."
+    return search
+
+uniform_cost_search = relaxing_search(False)
+astar_search = relaxing_search(True)
@@ -1,67 +1,239 @@
 #!/usr/bin/env python
 
+from array import array
+from collections import defaultdict
 import gc
 from heapq import heappush, heappop
 from itertools import *
+import marshal
+import os
 import string
 import time
 
 
-default_dictionary = set([
+def load_dictionary(filename):
+    "Read a set of lowercase words from a file with one word per line."
+    return set([
         s.lower()
-        for s in imap(str.strip, file('/usr/share/dict/american-english'))
+        for s in imap(str.strip, file(filename))
         if s and "'" not in s])
 
-def memoized(f):
+default_dictionary_filename = '/usr/share/dict/american-english'
+dictionary_cache_dir = os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+        'wordchain')
+
+_default_dictionary = None
+def default_dictionary():
     """
-    Wrap a function so it remembers the results of former calls to it, ignoring
-    argument order.
+    Return the set of words in `default_dictionary_filename`.
+
+    This is only read on first use.  Parsing the word list is slow, so we
+    also keep the result in `dictionary_cache_dir`, in marshal format, and
+    read it from there while the word list file doesn't change.
     """
-    d = {}
-    def wrapper(w1, w2):
-        if (w1, w2) not in d:
-            d[w1, w2] = f(w1, w2)
-        return d[w1, w2]
-    return wrapper
-
-@memoized
+    global _default_dictionary
+    if _default_dictionary is None:
+        _default_dictionary = load_cached_dictionary(
+                default_dictionary_filename)
+    return _default_dictionary
+
+def load_cached_dictionary(filename):
+    st = os.stat(filename)
+    key = (os.path.abspath(filename), st.st_mtime, st.st_size)
+    cache_filename = os.path.join(dictionary_cache_dir,
+                                  '%x.marshal' % abs(hash(key[0])))
+    try:
+        with file(cache_filename, 'rb') as f:
+            cached_key, words = marshal.load(f)
+        if cached_key == key:
+            return set(words)
+    except (IOError, EOFError, ValueError, TypeError):
+        pass
+    ret = load_dictionary(filename)
+    try:
+        if not os.path.isdir(dictionary_cache_dir):
+            os.makedirs(dictionary_cache_dir)
+        # Write to a temporary file first so concurrent readers never see a
+        # partial cache.
+        temp_filename = '%s.%d' % (cache_filename, os.getpid())
+        with file(temp_filename, 'wb') as f:
+            marshal.dump((key, list(ret)), f)
+        os.rename(temp_filename, cache_filename)
+    except (IOError, OSError):
+        # The cache is just an optimization.
+        pass
+    return ret
+
 def edit_distance(w1, w2):
-    if not w1 or not w2:
-        return max(len(w1), len(w2))
-    elif w1[0] == w2[0]:
-        # First character matches, move on.
-        return edit_distance(w1[1:], w2[1:])
-    else:
-        # In the general case I want to reduce everything to an operation that
-        # reduces the length of either word.  To be sure that's correct, I
-        # need to prove that it's ok to substitute the removal of a letter in
-        # word `a` for the addition of a letter in word `b`.  This is perhaps
-        # the same as assuming that adding letters to the longer word never
-        # gives you a shorter path from one word to the other (prove this too).
-        #
-        # I'm assuming this/these for the time being.
-        # Edit: the Wikipedia version does the same thing, just building a 
-        # table instead of abusing the stack.  So the above assumptions must
-        # be right.  I'll keep this for the time being.
-        return min(edit_distance(w1[1:], w2),
-                   edit_distance(w1, w2[1:]),
-                   edit_distance(w1[1:], w2[1:])  # substitute the first letter 
-                                                  # of one word to match the 
-                                                  # other
-                   ) + 1
-
-# I want to use memoization only for a lookup table of size up to (n^2)/2 the 
-# dictionary size, not for every recursive call of edit_distance.  The latter
-# approach might be an overall win, but I don't know an upper bound on the
-# size of the table that would be needed for it.
-#ms_edit_distance = memoized_symmetric(edit_distance)
+    """
+    Levenshtein distance between `w1` and `w2`.
+
+    This is Myers' bit-parallel algorithm (in Hyyro's formulation for the
+    distance between whole strings): a column of the dynamic programming
+    table is kept as bit vectors of the vertical +1/-1 deltas, one bit per
+    letter of the shorter word, so each letter of the longer word costs a
+    handful of integer operations instead of a loop over the column.
+
+    Python ints don't overflow, so words of any length work; words are short
+    enough that it doesn't matter that long ints are slower.
+    """
+    if len(w1) < len(w2):
+        w1, w2 = w2, w1
+    m = len(w2)
+    if not m:
+        return len(w1)
+    # Bit i of masks[c] is set iff w2[i] == c.
+    masks = {}
+    bit = 1
+    for c in w2:
+        masks[c] = masks.get(c, 0) | bit
+        bit <<= 1
+    full = bit - 1
+    last = bit >> 1
+    positive = full
+    negative = 0
+    score = m
+    for c in w1:
+        eq = masks.get(c, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        horizontal_positive = negative | (~(xh | positive) & full)
+        horizontal_negative = positive & xh
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        horizontal_positive = ((horizontal_positive << 1) | 1) & full
+        horizontal_negative = (horizontal_negative << 1) & full
+        positive = horizontal_negative | (~(xv | horizontal_positive) & full)
+        negative = horizontal_positive & xv
+    return score
+
+class bounded_cache:
+    """
+    Remember the results of a function for the most recently used (at least
+    `size` // 2, at most `size`) combinations of arguments.
+
+    Rather than keeping exact LRU order, results live in two generations of
+    plain dicts: hits in the old generation are promoted to the new one, and
+    when the new one fills up the old one is dropped.  This bounds memory
+    like an LRU cache would, but a hit costs a single dict lookup.
+
+    Results can also be added with `set` and looked up with `get`, in which
+    case `f` can be None.
+    """
+    def __init__(self, f, size=1 << 16):
+        self.f = f
+        self.size = size
+        self.new = {}
+        self.old = {}
+
+    def __call__(self, *key):
+        try:
+            return self.new[key]
+        except KeyError:
+            pass
+        ret = self.get(key)
+        if ret is None:
+            ret = self.f(*key)
+        self.set(key, ret)
+        return ret
+
+    def get(self, key, default=None):
+        "Return the cached result for the tuple of arguments `key`, if any."
+        try:
+            return self.new[key]
+        except KeyError:
+            return self.old.get(key, default)
+
+    def set(self, key, value):
+        if key not in self.new and len(self.new) >= self.size // 2:
+            self.old = self.new
+            self.new = {}
+        self.new[key] = value
+
+    def __len__(self):
+        return len(self.new) + len(self.old)
+
+    def clear(self):
+        self.new = {}
+        self.old = {}
+
+class goal_distances:
+    """
+    Lower bounds on the length of a chain from each word of `index` to
+    `goal`, as a table indexed by word id.
+
+    Words up to `radius` edits away from the goal get their exact distance,
+    found by a breadth first search out of the goal when the table is built.
+    The rest of the table is filled as it's asked for, with the edit
+    distance to the goal or `radius` + 1, whichever is larger.  Both bounds
+    are consistent, and so is their maximum.
+
+    Like the search itself, this takes the neighbor relation to be
+    symmetric.
+    """
+    def __init__(self, index, goal, radius=0):
+        self.words = index.words
+        self.goal = goal
+        self.floor = radius + 1 if radius else 0
+        # -1 for not computed yet.
+        self.values = values = array('b', [-1]) * len(index)
+        if radius:
+            import wordgraph
+            by_word = index.index_by_word
+            if goal in by_word:
+                offset, sources = 0, [by_word[goal]]
+            else:
+                offset, sources = 1, [by_word[w] for w in index.neighbors(goal)]
+            distances, parents = wordgraph.bfs(index, sources, radius - offset)
+            for i, d in enumerate(distances):
+                if d >= 0:
+                    values[i] = d + offset
+
+    def __getitem__(self, i):
+        ret = self.values[i]
+        if ret < 0:
+            ret = self.fill(i)
+        return ret
+
+    def fill(self, i):
+        ret = self.values[i] = min(127, max(self.floor,
+                                            edit_distance(self.words[i],
+                                                          self.goal)))
+        return ret
+
+# The tables of the goals of the latest searches, by (index, goal, radius).
+goal_tables = bounded_cache(goal_distances, 16)
 
 
 def wordchain(start, 
               goal, 
-              dictionary=default_dictionary, 
+              dictionary=None, 
               log_fn=None,
-              graph=None):
+              graph=None,
+              stats=None,
+              index=None,
+              radius=0):
+    """
+    Find a shortest chain of single edits (see `single_edits`) that turns
+    `start` into `goal`, going only through words in `dictionary` (by
+    default, `default_dictionary()`).
+
+    `index` is a neighbor_index for `dictionary` by default.  A
+    wordgraph.word_graph loaded from a file will also do, in which case
+    `dictionary` is not used.  Either way, words are handled by their id in
+    the index.
+
+    Words up to `radius` edits away from `start` and `goal` get exact
+    heuristic estimates (see `goal_distances`).
+
+    If the index's components have been labelled already (word graph files
+    come with them), words in different components are found to have no
+    chain without searching.  Labelling them takes longer than most
+    searches, so it's not done just for this.
+    """
 
     if log_fn is None:
         def log(*what):
@@ -77,14 +249,96 @@ def wordchain(start,
         def add_edge(a, b):
             graph.append((a, b))
 
+    if index is None:
+        if dictionary is None:
+            dictionary = default_dictionary()
+        index = index_for(dictionary)
+
+    # `start` and `goal` may not be in the index; if so, they get the ids
+    # after the last word.
+    words = index.words
+    by_word = index.index_by_word
+    outside = [w for w in (start, goal) if w not in by_word]
+    n = len(words)
+    def word(i):
+        if i < n:
+            return words[i]
+        return outside[i - n]
+    def word_id(w):
+        if w in by_word:
+            return by_word[w]
+        return n + outside.index(w)
+    def expand(i):
+        if i < n:
+            return index.neighbor_ids(i)
+        return [by_word[w] for w in index.neighbors(outside[i - n])]
+
+    if stats is not None:
+        log = stats.wrap_log(log)
+        expand = stats.wrap_expand(expand)
+
     log("start", start)
     log("goal", goal)
 
+    labels = index.known_components
+    if labels is not None and not outside:
+        if labels[by_word[start]] != labels[by_word[goal]]:
+            # There's no chain between different components.
+            log("step", 0)
+            return None
+
     gc.disable()
 
+    # Every chain considered is a frontier entry: a word id and the entry of
+    # the chain it extends, kept in these arrays (shared by both searches)
+    # and referred to by its position in them.
+    entry_words = array('i')
+    entry_parents = array('i')
+    def new_entry(i, parent):
+        entry_words.append(i)
+        entry_parents.append(parent)
+        return len(entry_words) - 1
+    def chain(entry):
+        "Word ids in the chain ending at `entry`, from its root."
+        ret = []
+        while entry != -1:
+            ret.append(entry_words[entry])
+            entry = entry_parents[entry]
+        ret.reverse()
+        return ret
+
     # Bidirectional A* with edit_distance as the heuristic.
-    search_from_start = AStarSearchState(start, goal)
-    search_from_goal = AStarSearchState(goal, start)
+    #
+    # Each search keeps the cheapest entry found so far for every word it
+    # has reached.  Whenever a search reaches a word the other one has
+    # reached too, the two chains make a solution.  `best` is the cheapest
+    # of those so far, as (cost, entry from start, entry from goal).
+    #
+    # edit_distance is a consistent heuristic (an edit changes the distance
+    # to any word by at most one), and so are the goal_distances tables.
+    # Every chain cheaper than `best` would have to pass through some word
+    # in each frontier with an estimate no higher than its cost, so once
+    # the lowest estimate in either frontier is at least `best`, there is
+    # no better solution left to find.
+    #
+    # Since words popped from a frontier are reached at their lowest cost,
+    # such a chain would also have to join a word in the start frontier to
+    # a different word in the goal frontier (if it's the same word, we
+    # have seen that solution already).  So it costs at least the sum of
+    # the lowest costs so far in both frontiers, plus one edit, and once
+    # that sum is at least `best` we are done too.  With a weak heuristic
+    # this is what stops most searches.
+    start_id = word_id(start)
+    goal_id = word_id(goal)
+    search_from_start = AStarSearchState(start_id,
+                                         new_entry(start_id, -1),
+                                         goal_tables(index, goal, radius))
+    search_from_goal = AStarSearchState(goal_id,
+                                        new_entry(goal_id, -1),
+                                        goal_tables(index, start, radius))
+    best = None
+    if start_id == goal_id:
+        best = 0, search_from_start.reached[start_id][1], -1
 
     permutations = [(search_from_start, search_from_goal, 'red'),
                     (search_from_goal, search_from_start, 'blue')]
@@ -92,63 +346,107 @@ def wordchain(start,
     start_time = time.time()
     while search_from_start.frontier and search_from_goal.frontier:
         log("step", time.time() - start_time)
-        for search, other, color in permutations:
-            estimated_cost, cost_so_far, chain, contact = heappop(search.frontier)
-            last = chain[-1]
-            if last in search.visited:
-                # We have considered a chain that reaches this node earlier.
+        if best is not None and (
+                search_from_start.frontier[0][0] >= best[0]
+                or search_from_goal.frontier[0][0] >= best[0]
+                or (search_from_start.lowest_cost()
+                    + search_from_goal.lowest_cost() + 1 >= best[0])):
+            break
+        # Expand the search with the smaller frontier.  Once either runs
+        # out of promising chains we are done, so that's the one to push.
+        if len(search_from_start.frontier) <= len(search_from_goal.frontier):
+            search, other, color = permutations[0]
+        else:
+            search, other, color = permutations[1]
+        estimated_cost, cost_so_far, last, entry = heappop(search.frontier)
+        search.open_costs[cost_so_far] -= 1
+        if stats is not None:
+            stats.pop()
+        if last in search.visited:
+            # We have considered a chain that reaches this node earlier.
+            if stats is not None:
+                stats.visited_hit()
+            continue
+        parent = entry_parents[entry]
+        log("vertex_color", word(last), color)
+        if parent != -1:
+            log("edge_color", word(entry_words[parent]), word(last), color)
+        search.visited.add(last)
+        heuristic = search.heuristic.values
+        reached = search.reached
+        other_reached = other.reached
+        cost = cost_so_far + 1
+        for i in expand(last):
+            add_edge(word(last), words[i]) 
+            if i in search.visited:
+                if stats is not None:
+                    stats.visited_hit()
+                continue
+            if i in reached and reached[i][0] <= cost:
+                # Already in the frontier, at least as cheaply.
                 continue
-            log("vertex_color", last, color)
-            if len(chain) > 1:
-                log("edge_color", chain[-2], last, color)
-            search.visited.add(last)
-            if contact:
-                solution = chain + list(reversed(contact[0]))
-                if search is search_from_goal:
-                    solution.reverse()
-                log("step", time.time() - start_time)
-                for a, b in izip(solution[:-1], solution[1:]):
-                    if a != last:
-                        log("vertex_color", a, "green")
-                    if b != last:
-                        log("vertex_color", b, "green")
-                    log("edge_color", a, b, "green")
-                log("vertex_color", last, "yellow")
-                print "solution has length", len(solution)
-                return solution
-            for ec, csf, other_chain, other_contact in other.frontier:
-                if other_chain[-1] == last:
-                    # If I had visited this word before I would have `continue`d
-                    # in the first check above.
-                    assert not other_contact
-                    other_contact.append(chain[:-1])
-            for word in single_edits(last):
-                if word in dictionary and word != last:
-                    add_edge(last, word) 
-                    if word not in search.visited:
-                        log("vertex_color", word, 'dark_' + color)
-                        log("edge_color", last, word, 'dark_' + color)
-                        heappush(search.frontier, 
-                                 (cost_so_far + edit_distance(word, search.goal), 
-                                  cost_so_far + 1, 
-                                  chain + [word], 
-                                  []))
+            new = new_entry(i, entry)
+            reached[i] = cost, new
+            if i in other_reached:
+                other_cost, other_entry = other_reached[i]
+                if best is None or cost + other_cost < best[0]:
+                    if search is search_from_start:
+                        best = cost + other_cost, new, other_entry
+                    else:
+                        best = cost + other_cost, other_entry, new
+            # Neighbors are always in the index, so they have a place
+            # in the table.
+            h = heuristic[i]
+            if h < 0:
+                h = search.heuristic.fill(i)
+            if best is not None and cost + h >= best[0]:
+                # Can't be part of a better solution.
+                continue
+            log("vertex_color", words[i], 'dark_' + color)
+            log("edge_color", word(last), words[i], 'dark_' + color)
+            heappush(search.frontier, (cost + h, cost, i, new))
+            if cost == len(search.open_costs):
+                search.open_costs.append(0)
+            search.open_costs[cost] += 1
+            if stats is not None:
+                stats.push((color, i), len(search.frontier))
     log("step", time.time() - start_time)
-    return None
-
-def endnodes(frontier):
-    for estimated_cost, cost_so_far, chain in frontier:
-        yield chain[-1]
+    if best is None:
+        return None
+    cost, from_start, from_goal = best
+    solution = map(word, chain(from_start) + chain(from_goal)[::-1][1:])
+    meeting = word(entry_words[from_start])
+    for a, b in izip(solution[:-1], solution[1:]):
+        if a != meeting:
+            log("vertex_color", a, "green")
+        if b != meeting:
+            log("vertex_color", b, "green")
+        log("edge_color", a, b, "green")
+    log("vertex_color", meeting, "yellow")
+    print "solution has length", len(solution)
+    return solution
 
 class AStarSearchState:
-    def __init__(self, start, goal):
+    def __init__(self, start, entry, heuristic):
         self.visited = set()
-        # Estimated cost, cost so far, chain, contact.
-        #
-        # I pick a list for contact to make it mutable and easy to check 
-        # for (non)emptiness.
-        self.frontier = [(0, 0, [start], [])]
-        self.goal = goal
+        # Estimated cost, cost so far, word id, entry.
+        self.frontier = [(0, 0, start, entry)]
+        # The cheapest (cost so far, entry) found for every word reached.
+        self.reached = {start: (0, entry)}
+        # A goal_distances table for the goal of this search.
+        self.heuristic = heuristic
+        # How many frontier entries there are with each cost so far, and
+        # the lowest cost that may have any.
+        self.open_costs = [1]
+        self.min_cost = 0
+
+    def lowest_cost(self):
+        "Lowest cost so far of the entries in the frontier."
+        open_costs = self.open_costs
+        while (self.min_cost < len(open_costs) - 1
+               and not open_costs[self.min_cost]):
+            self.min_cost += 1
+        return self.min_cost
 
 def single_edits(word):
     for letter in string.lowercase:
@@ -163,23 +461,174 @@ def single_edits(word):
             if edit != suffix:
                 yield word[0] + edit
 
+class neighbor_index:
+    """
+    Find the words in a dictionary that are a single edit away from a given
+    word, without generating and looking up every possible edit.
+
+    `neighbors(word)` returns the same words as 
+
+        [edit for edit in set(single_edits(word))
+              if edit in dictionary and edit != word]
+
+    (in no particular order), but its cost is proportional to the number of
+    actual neighbors, rather than to the size of the alphabet times the
+    length of the word.
+
+    Substitutions are found by bucketing the dictionary by wildcard patterns
+    (the word with one letter blanked out), and insertions by mapping each
+    word to the longer words that it's a deletion of.  Deletions are just
+    looked up.
+
+    Like a wordgraph.word_graph, the index also numbers the words of the
+    dictionary in sorted order: `words[i]` is the word with id `i`, and
+    `neighbor_ids(i)` are the ids of its neighbors.
+
+    The neighbors of the last `cache_size` or fewer words asked about are
+    remembered.  The dictionary must not change after the index is built.
+    """
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        letters = frozenset(string.lowercase)
+        buckets = defaultdict(list)
+        self.supersets = defaultdict(list)
+        for word in dictionary:
+            deletions = set()
+            for i in xrange(len(word)):
+                buckets[word[:i] + '\0' + word[i+1:]].append(word)
+                # single_edits only inserts lowercase letters.
+                if word[i] in letters:
+                    deletions.add(word[:i] + word[i+1:])
+            for deletion in deletions:
+                if deletion in dictionary:
+                    self.supersets[deletion].append(word)
+        # Most patterns match only the word that generated them.
+        self.buckets = dict((pattern, words)
+                            for pattern, words in buckets.iteritems()
+                            if len(words) > 1)
+        self.cache = {}
+        self.cache_size = 1 << 16
+        self.letters = letters
+        self.words = sorted(dictionary)
+        self.index_by_word = dict((w, i) for i, w in enumerate(self.words))
+        self._components = None
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index_by_word
+
+    @property
+    def components(self):
+        "Connected component label of every word (see wordgraph.components)."
+        if self._components is None:
+            import wordgraph
+            self._components = wordgraph.components(self)
+        return self._components
+
+    @property
+    def known_components(self):
+        "`components`, if they have been labelled already, or None."
+        return self._components
+
+    def neighbors(self, word):
+        try:
+            return self.cache[word]
+        except KeyError:
+            pass
+        ret = []
+        buckets = self.buckets
+        for i in xrange(len(word)):
+            for other in buckets.get(word[:i] + '\0' + word[i+1:], ()):
+                # single_edits only substitutes lowercase letters in.
+                if other[i] in self.letters and other != word:
+                    ret.append(other)
+        ret.extend(set(deletion 
+                       for deletion in (word[:i] + word[i+1:]
+                                        for i in xrange(len(word)))
+                       if deletion in self.dictionary))
+        ret.extend(self.supersets.get(word, ()))
+        if len(self.cache) >= self.cache_size:
+            self.cache = {}
+        self.cache[word] = ret
+        return ret
+
+    def neighbor_ids(self, i):
+        by_word = self.index_by_word
+        return [by_word[w] for w in self.neighbors(self.words[i])]
+
+# Index of the last dictionary index_for was asked about, as
+# (dictionary, its size then, index).
+last_index = None
+
+def index_for(dictionary):
+    """
+    Return a neighbor_index for `dictionary`, reusing the last one built if
+    it was for this same dictionary.
+
+    Only one index is kept, and with it its dictionary (which the index
+    refers to anyway), until another dictionary is asked about, though
+    `goal_tables` holds on to the indexes of its last few tables too.  If
+    the dictionary has changed size since then, the index is rebuilt.
+    Callers that modify their dictionary in other ways should build their
+    own neighbor_index and pass it to `wordchain` explicitly.
+    """
+    global last_index
+    if last_index is not None:
+        last_dictionary, size, index = last_index
+        if last_dictionary is dictionary and size == len(dictionary):
+            return index
+    index = neighbor_index(dictionary)
+    last_index = dictionary, len(dictionary), index
+    return index
+
 if __name__ == '__main__':
     import sys
-    if len(sys.argv) not in [3, 4]:
-        print "Usage: %s <start_word> <goal_word> [<times>=1]" % sys.argv[0]
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], True)
+                   for arg in sys.argv[1:]
+                   if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if (len(args) not in [2, 3]
+        or options.get('graph') is True
+        or options.get('radius') is True
+        or options.get('layout') is True):
+        print ("Usage: %s [--graph=<word_graph_file>] [--radius=<r>] "
+               "[--layout=<graph_file>] <start_word> <goal_word> [<times>=1]"
+               % sys.argv[0])
         sys.exit(1)
-    if len(sys.argv) == 4:
-        times = int(sys.argv[3])
+    if len(args) == 3:
+        times = int(args[2])
     else:
         times = 1
+    if 'graph' in options:
+        import wordgraph
+        index = wordgraph.load(options['graph'])
+    else:
+        index = None
+    radius = int(options.get('radius', 0))
     for i in xrange(times-1):
-        wordchain(*sys.argv[1:3])
+        wordchain(*args[:2], index=index, radius=radius)
     # XXX: temporary hack to check something...
     graph = []
     with file('history', 'w') as out:
-        words = wordchain(sys.argv[1], sys.argv[2], log_fn=out.write, graph=graph)
+        words = wordchain(args[0], args[1], log_fn=out.write, graph=graph,
+                          index=index, radius=radius)
     import makegraph
-    makegraph.write_graph(graph, file('-'.join(sys.argv[1:3]) + '.graph', 'w'))
+    # Place the words where they are in the layout of the whole dictionary,
+    # if we have one, so all these files look alike.
+    master = None
+    if index is not None and index.positions is not None:
+        master = dict((w, index.position(i))
+                      for w, i in index.index_by_word.iteritems())
+    elif os.path.exists(options.get('layout', 'graph')):
+        master = makegraph.read_positions(options.get('layout', 'graph'))
+    positions = None
+    if master is not None:
+        import layout
+        positions = layout.incremental_layout(graph, master)
+    makegraph.write_graph(graph, file('-'.join(args[:2]) + '.graph', 'w'),
+                          positions)
     if words is None:
         print "No chain found."
     else:
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+
+"""
+Compact, indexed file format for the graph of words one edit away from each
+other.
+
+Building the word graph means finding the neighbors of every word in the
+dictionary, which takes a while.  This does it once and stores the result:
+
+    python wordgraph.py <output> [<dictionary>] [--layout=<graph_file>]
+
+The file contains, in this order:
+
+    - the line "WORDGRAPH 1".
+    - a header with the number of words, the number of adjacency entries
+      and flags, as little endian unsigned 32 bit ints.  The flags say
+      whether there is a layout (`has_layout`) and component labels
+      (`has_components`).
+    - the words, sorted and separated by newlines, preceded by their total
+      length in bytes (also as a 32 bit int).  A word's index in this list is
+      its id.
+    - `offsets` and `targets`, the adjacency in compressed sparse row form
+      as 32 bit ints: the neighbors of word `i` are the words with ids
+      `targets[offsets[i]:offsets[i+1]]`, in increasing order.
+    - optionally, x and y coordinates for each word, as doubles, in the same
+      order as the words.
+    - optionally, the label of each word's connected component (see
+      `components`), as 32 bit ints, in the same order as the words.
+
+The neighbors of a word are those that wordchain.single_edits would find for
+it.
+
+A layout can be copied from a graph file in the format searchview reads
+(e.g. `graph`), so searchview can show the word graph directly from this file
+(see searchdata.graph_lines).
+
+`bfs` finds the distances from some words to every other one, and
+`components` labels the words by connected component.  Both work on
+wordchain.neighbor_index too.
+"""
+
+from array import array
+from itertools import islice
+import struct
+import sys
+
+
+magic = "WORDGRAPH 1\n"
+header = struct.Struct('<III')
+# Header flags.
+has_layout = 1
+has_components = 2
+
+def int_array(values=()):
+    ret = array('i', values)
+    assert ret.itemsize == 4
+    return ret
+
+class word_graph:
+
+    def __init__(self, words, offsets, targets, positions=None):
+        """
+        `words` is a sorted list of words.  `offsets` and `targets` are 32 bit
+        int arrays with the adjacency, and `positions` an optional double
+        array with the interleaved x, y coordinates of the words.
+        """
+        self.words = words
+        self.offsets = offsets
+        self.targets = targets
+        self.positions = positions
+        self._index_by_word = None
+        self._components = None
+
+    @property
+    def index_by_word(self):
+        if self._index_by_word is None:
+            self._index_by_word = dict((w, i)
+                                       for i, w in enumerate(self.words))
+        return self._index_by_word
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index_by_word
+
+    def neighbor_ids(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i+1]]
+
+    def neighbors(self, word):
+        """
+        Same interface as wordchain.neighbor_index.neighbors.  Words not in
+        the graph have no neighbors.
+        """
+        words = self.words
+        i = self.index_by_word.get(word)
+        if i is None:
+            return []
+        return [words[j] for j in self.neighbor_ids(i)]
+
+    def edges(self):
+        """
+        Yield every edge as a (word, word) pair, once, whatever its direction.
+        """
+        words = self.words
+        offsets = self.offsets
+        targets = self.targets
+        for i in xrange(len(words)):
+            for k in xrange(offsets[i], offsets[i+1]):
+                j = targets[k]
+                if i < j or i not in self.neighbor_ids(j):
+                    yield words[i], words[j]
+
+    @property
+    def components(self):
+        "Connected component label of every word (see `components`)."
+        if self._components is None:
+            self._components = components(self)
+        return self._components
+
+    @property
+    def known_components(self):
+        "`components`, if they have been labelled already, or None."
+        return self._components
+
+    def position(self, i):
+        return self.positions[2*i], self.positions[2*i+1]
+
+    def write(self, out):
+        "Write the graph to a file, with its component labels."
+        data = '\n'.join(self.words)
+        out.write(magic)
+        out.write(header.pack(len(self.words),
+                              len(self.targets),
+                              has_components
+                              | (has_layout if self.positions is not None
+                                 else 0)))
+        out.write(struct.pack('<I', len(data)))
+        out.write(data)
+        for a in (self.offsets, self.targets, self.positions,
+                  self.components):
+            if a is not None:
+                write_array(out, a)
+
+def write_array(out, a):
+    "Write an array to a file, little endian."
+    if sys.byteorder != 'little':
+        a = array(a.typecode, a)
+        a.byteswap()
+    a.tofile(out)
+
+def build(dictionary, positions=None):
+    """
+    Build the word_graph for the words in `dictionary`.
+
+    If given, `positions` maps words to (x, y) tuples; every word in the
+    dictionary must be in it.
+    """
+    import wordchain
+    index = wordchain.neighbor_index(dictionary)
+    words = sorted(dictionary)
+    index_by_word = dict((w, i) for i, w in enumerate(words))
+    offsets = int_array([0])
+    targets = int_array()
+    for word in words:
+        targets.extend(sorted(index_by_word[n] for n in index.neighbors(word)))
+        offsets.append(len(targets))
+    if positions is not None:
+        positions = array('d', (c for w in words for c in positions[w]))
+    ret = word_graph(words, offsets, targets, positions)
+    ret._index_by_word = index_by_word
+    return ret
+
+def from_pairs(names, pairs, positions=None):
+    """
+    Build the word_graph with the words in `names` and the edges in
+    `pairs`, an iterable of (i, j) pairs of indices into `names`, each
+    edge once.
+
+    If given, `positions` maps words to (x, y) tuples, like in `build`.
+    """
+    words = sorted(names)
+    index_by_word = dict((w, i) for i, w in enumerate(words))
+    ids = int_array(index_by_word[name] for name in names)
+    ends = int_array()
+    for i, j in pairs:
+        ends.append(ids[i])
+        ends.append(ids[j])
+    degrees = int_array([0]) * (len(words) + 1)
+    for i in ends:
+        degrees[i + 1] += 1
+    offsets = int_array([0])
+    for degree in islice(degrees, 1, None):
+        offsets.append(offsets[-1] + degree)
+    targets = int_array([0]) * len(ends)
+    cursor = int_array(offsets)
+    for k in xrange(0, len(ends), 2):
+        i, j = ends[k], ends[k+1]
+        targets[cursor[i]] = j
+        cursor[i] += 1
+        targets[cursor[j]] = i
+        cursor[j] += 1
+    for i in xrange(len(words)):
+        targets[offsets[i]:offsets[i+1]] = int_array(
+                sorted(targets[offsets[i]:offsets[i+1]]))
+    if positions is not None:
+        positions = array('d', (c for w in words for c in positions[w]))
+    ret = word_graph(words, offsets, targets, positions)
+    ret._index_by_word = index_by_word
+    return ret
+
+def bfs(graph, sources, max_depth=None):
+    """
+    Breadth first search out of the word ids in `sources`, all at once.
+
+    `graph` is a word_graph, or anything else with `neighbor_ids` and
+    `__len__` (e.g. a wordchain.neighbor_index).  Return two arrays indexed
+    by word id: the number of edits from the nearest source (-1 for words
+    not reached), and the word before it in a shortest chain from there (-1
+    for sources and words not reached).  If `max_depth` is given, words
+    further than that from every source are not reached.
+    """
+    n = len(graph)
+    distances = int_array([-1]) * n
+    parents = int_array([-1]) * n
+    layer = []
+    for i in sources:
+        if distances[i] < 0:
+            distances[i] = 0
+            layer.append(i)
+    depth = 0
+    while layer and (max_depth is None or depth < max_depth):
+        depth += 1
+        next_layer = []
+        for i in layer:
+            for j in graph.neighbor_ids(i):
+                if distances[j] < 0:
+                    distances[j] = depth
+                    parents[j] = i
+                    next_layer.append(j)
+        layer = next_layer
+    return distances, parents
+
+def chain(parents, i):
+    "Word ids from a source of `bfs` to `i`, given its `parents` array."
+    ret = []
+    while i != -1:
+        ret.append(i)
+        i = parents[i]
+    ret.reverse()
+    return ret
+
+def components(graph):
+    """
+    Label the words of `graph` by connected component.
+
+    Return an array with a label for every word id, such that two words
+    have the same label iff there is a chain of edits between them in
+    either direction.  Labels are numbered from 0, in the order of the
+    lowest word id in each component.
+
+    This is union-find over every edge, so that words are only joined by
+    edges that actually exist in whatever direction they do.
+    """
+    n = len(graph)
+    roots = int_array(xrange(n))
+    def find(i):
+        while roots[i] != i:
+            # Path halving.
+            roots[i] = i = roots[roots[i]]
+        return i
+    for i in xrange(n):
+        for j in graph.neighbor_ids(i):
+            a = find(i)
+            b = find(j)
+            if a != b:
+                if a < b:
+                    roots[b] = a
+                else:
+                    roots[a] = b
+    labels = int_array([-1]) * n
+    count = 0
+    for i in xrange(n):
+        root = find(i)
+        if labels[root] < 0:
+            labels[root] = count
+            count += 1
+        labels[i] = labels[root]
+    return labels
+
+def component_sizes(labels):
+    "Number of words with each label, as returned by `components`."
+    ret = int_array([0]) * (max(labels) + 1 if labels else 0)
+    for label in labels:
+        ret[label] += 1
+    return ret
+
+def is_word_graph_file(filename):
+    with file(filename, 'rb') as f:
+        return f.read(len(magic)) == magic
+
+def load(filename):
+    with file(filename, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError("%s is not a word graph file" % filename)
+        num_words, num_targets, flags = header.unpack(f.read(header.size))
+        length, = struct.unpack('<I', f.read(4))
+        words = f.read(length).split('\n') if num_words else []
+        assert len(words) == num_words
+        arrays = []
+        for typecode, size in [('i', num_words + 1),
+                               ('i', num_targets),
+                               ('d', 2 * num_words
+                                     * bool(flags & has_layout)),
+                               ('i', num_words
+                                     * bool(flags & has_components))]:
+            a = array(typecode)
+            a.fromfile(f, size)
+            if sys.byteorder != 'little':
+                a.byteswap()
+            arrays.append(a)
+    offsets, targets, positions, labels = arrays
+    ret = word_graph(words, offsets, targets,
+                     positions if flags & has_layout else None)
+    if flags & has_components:
+        ret._components = labels
+    return ret
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], True)
+                   for arg in sys.argv[1:]
+                   if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) not in [1, 2] or options.get('layout') is True:
+        print ("Usage: %s <output> [<dictionary>] [--layout=<graph_file>]"
+               % sys.argv[0])
+        sys.exit(1)
+    import wordchain
+    if len(args) == 2:
+        dictionary = wordchain.load_dictionary(args[1])
+    else:
+        dictionary = wordchain.default_dictionary()
+    positions = None
+    if 'layout' in options:
+        import prettygraph
+        positions = dict((v.id, (v.x, v.y))
+                         for v in prettygraph.load_vertices(options['layout']))
+        missing = [w for w in dictionary if w not in positions]
+        if missing:
+            print len(missing), "words have no position in", options['layout'],
+            print "(e.g. %r); they won't be included." % missing[0]
+            dictionary = set(w for w in dictionary if w in positions)
+    build(dictionary, positions).write(file(args[0], 'wb'))
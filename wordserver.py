@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+Answer many wordchain queries with a single loaded index.
+
+    python wordserver.py [--graph=<word_graph_file>] [--socket=<path>]
+                         [--workers=<n>] [--batch=<n>] [--radius=<r>]
+
+Queries are lines with a start word and a goal word, separated by spaces.
+Each gets an answer line with the two words, a colon and the chain found,
+if any:
+
+    rags riches: rags rages races rices riches
+    zzzx cold:
+
+Answers come in the same order as the queries.  Queries are read from
+stdin, or from every connection to a unix socket at `path` if --socket is
+given, and handled `batch` at a time (so for interactive use you want
+--batch=1).
+
+The index (a word graph file, or a neighbor_index of the default
+dictionary) is loaded once, before starting a pool of `workers` processes
+(by default, one per CPU; 0 for none) that share it.  The chains found are
+cached, whichever way round they were asked for, and the queries of a batch
+are sorted by goal before being handed out, so each worker can reuse its
+heuristic tables (see wordchain.goal_tables).
+"""
+
+from __future__ import division
+
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import wordchain
+
+
+# Set in the parent process before the pool is started, so the workers
+# inherit them.
+index = None
+radius = 0
+
+def load_index(graph_filename=None):
+    if graph_filename:
+        import wordgraph
+        ret = wordgraph.load(graph_filename)
+    else:
+        ret = wordchain.index_for(wordchain.default_dictionary())
+    # Label the components now, so the workers inherit the labels instead
+    # of each computing its own.
+    ret.components
+    return ret
+
+def silence():
+    "Keep wordchain's progress messages out of our output."
+    sys.stdout = file(os.devnull, 'w')
+
+def solve((start, goal)):
+    stdout = sys.stdout
+    silence()
+    try:
+        return wordchain.wordchain(start, goal, index=index, radius=radius)
+    finally:
+        sys.stdout = stdout
+
+class server:
+
+    def __init__(self, workers=None, batch=1000, cache_size=1 << 16):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        if workers == 0:
+            self.pool = None
+        else:
+            self.pool = multiprocessing.Pool(workers, silence)
+        self.batch = batch
+        self.cache = wordchain.bounded_cache(None, cache_size)
+        self.queries = 0
+        self.hits = 0
+        self.time = 0.
+
+    def solve_all(self, pairs):
+        "Return the chains for a list of (start, goal) pairs."
+        begin = time.time()
+        keys = [(min(pair), max(pair)) for pair in pairs]
+        # The chains for this batch; filling the cache with the new ones may
+        # drop others from it before they're answered.
+        found = {}
+        for key in keys:
+            chain = self.cache.get(key)
+            if chain is not None:
+                found[key] = chain
+        misses = sorted(set(key for key in keys if key not in found),
+                        key=(lambda (a, b): (b, a)))
+        if self.pool is None or len(misses) < 2:
+            chains = map(solve, misses)
+        else:
+            chains = self.pool.map(solve, misses,
+                                   max(1, len(misses) // (4 * self.workers)))
+        for key, chain in zip(misses, chains):
+            # Unreachable pairs are cached as empty chains.
+            found[key] = chain or []
+            self.cache.set(key, found[key])
+        ret = []
+        for (start, goal), key in zip(pairs, keys):
+            chain = found[key]
+            if chain and chain[0] != start:
+                chain = chain[::-1]
+            ret.append(chain or None)
+        self.queries += len(pairs)
+        self.hits += len(pairs) - len(misses)
+        self.time += time.time() - begin
+        return ret
+
+    def serve(self, in_, out):
+        "Answer the queries read from file `in_`, writing them to `out`."
+        while True:
+            lines = []
+            while len(lines) < self.batch:
+                line = in_.readline()
+                if not line:
+                    break
+                lines.append(line)
+            if not lines:
+                return
+            pairs = []
+            for line in lines:
+                words = line.split()
+                if len(words) == 2:
+                    pairs.append(tuple(words))
+            chains = iter(self.solve_all(pairs))
+            for line in lines:
+                words = line.split()
+                if len(words) == 2:
+                    chain = chains.next()
+                    out.write("%s %s:%s\n" % (words[0],
+                                               words[1],
+                                               ''.join(' ' + w
+                                                       for w in chain or ())))
+                else:
+                    out.write("? %s\n" % line.strip())
+            out.flush()
+
+    def serve_socket(self, path):
+        "Serve every connection to a unix socket at `path`, one at a time."
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(5)
+        try:
+            while True:
+                connection, address = listener.accept()
+                try:
+                    self.serve(connection.makefile('r'),
+                               connection.makefile('w'))
+                except socket.error, e:
+                    print >> sys.stderr, "Connection lost:", e
+                finally:
+                    connection.close()
+        finally:
+            listener.close()
+            os.remove(path)
+
+    def report(self):
+        print >> sys.stderr, "%d queries (%d cached) in %.3fs, %.0f per second" % (
+                self.queries, self.hits, self.time,
+                self.queries / self.time if self.time else 0)
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], True)
+                   for arg in sys.argv[1:]
+                   if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if args or any(value is True for value in options.values()):
+        print ("Usage: %s [--graph=<word_graph_file>] [--socket=<path>] "
+               "[--workers=<n>] [--batch=<n>] [--radius=<r>]" % sys.argv[0])
+        sys.exit(1)
+    index = load_index(options.get('graph'))
+    radius = int(options.get('radius', 0))
+    workers = options.get('workers')
+    s = server(workers and int(workers), int(options.get('batch', 1000)))
+    try:
+        if 'socket' in options:
+            s.serve_socket(options['socket'])
+        else:
+            s.serve(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    s.report()